@@ -0,0 +1,440 @@
+# Import all necessary packages
+
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from categories import ListingCrawler
+from field_selectors import FIELD_ORDER, missing_required
+from http_scraper import AmazonUKHttpScraper
+from metrics import inc
+
+
+# Text only found on the robot check page Amazon serves instead of the
+# requested page when it thinks it is being scraped too fast
+CAPTCHA_MARKERS = ('/errors/validateCaptcha', 'Type the characters you see in this image')
+
+# Status codes Amazon answers with when it wants requests to slow down
+THROTTLED = (429, 503)
+
+
+class Blocked(Exception):
+
+    """Raised when Amazon refuses a request with 503/429 or a captcha"""
+
+
+class TokenBucket():
+
+    """This class limits the rate of requests to a host. A token is needed
+    for every request; tokens are added at rate per second up to burst. The
+    rate is halved every time the host pushes back (503 or captcha) and
+    creeps back up towards max_rate with every successful request, hence
+    the scraper settles just below the rate Amazon tolerates.
+
+    Attributes:
+
+        rate (float): Current requests per second
+        max_rate (float): Requests per second allowed when nothing pushes
+        back
+        min_rate (float): The rate is never lowered below this
+        burst (float): Maximum number of tokens saved up
+        tokens (float): Tokens currently available
+
+    """
+
+    def __init__(self, rate: float, burst: float = 1, min_rate: float = 0.05):
+
+        """
+        See help(TokenBucket) for details
+        """
+
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    async def acquire(self):
+
+        """This coroutine waits until a request may be sent and takes a
+        token"""
+
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+    def penalize(self, pause: float):
+
+        """This method halves the rate and stops all requests to the host for
+        a while after it pushed back
+
+        Args:
+            pause (float): Seconds to send nothing to the host
+        """
+
+        now = time.monotonic()
+        # Requests which were already in flight when the host pushed back
+        # do not slow it down again
+        if self.paused_until <= now:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, now + pause)
+
+
+    def reward(self):
+
+        """This method raises the rate a little after a successful request"""
+
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class HostLimiter():
+
+    """This class keeps a token bucket per host
+
+    Attributes:
+
+        rate (float): Requests per second allowed per host
+        burst (float): Requests which may be sent at once per host
+        buckets (dict): The TokenBucket of every host seen so far
+
+    """
+
+    def __init__(self, rate: float, burst: float):
+
+        """
+        See help(HostLimiter) for details
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+
+    def bucket(self, url: str):
+
+        """This method returns the bucket of the host of a url
+
+        Args:
+            url (str): Any url of the host
+
+        Returns:
+            TokenBucket: The bucket of the host
+        """
+
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+
+def is_blocked(status: int, page_html):
+
+    """This function tells whether Amazon refused a request
+
+    Args:
+        status (int): The status code of the response
+        page_html (str, None): The html of the response
+
+    Returns:
+        bool: True for 503/429 responses and captcha pages
+    """
+
+    if status in THROTTLED:
+        return True
+    return bool(page_html) and any(marker in page_html for marker in CAPTCHA_MARKERS)
+
+
+def browser_blocked(driver):
+
+    """This function tells whether the page open in Chrome is Amazon's robot
+    check rather than the requested page
+
+    Args:
+        driver (WebDriver): The driver of a scraper
+
+    Returns:
+        bool: True if the page is a captcha page
+    """
+
+    try:
+        url = driver.current_url
+        page_html = driver.page_source
+    except Exception:
+        return False
+    return any(marker in url for marker in CAPTCHA_MARKERS) or is_blocked(0, page_html)
+
+
+class AsyncCollector():
+
+    """This class runs a scrape of Run_Scraper as concurrent asyncio tasks:
+    the listing pages, the product pages (over HTTP, falling back to the
+    warm Chrome sessions of the driver pool, or only with Chrome when the
+    fetch engine is selenium) and the product images. The blocking work runs
+    in a thread pool. Every request waits for a token of its host's bucket
+    and for one of concurrency global slots; on a 503, 429 or captcha the
+    host is slowed down and the request is retried with exponential backoff.
+
+    Attributes:
+
+        run (Run_Scraper): The scraper whose settings, driver pool, journal
+        and dedup index are used
+        concurrency (int): Maximum number of requests in flight
+        limiter (HostLimiter): Rate limits per host
+        max_retries (int): Attempts after which a blocked request gives up
+        backoff (float): Seconds to wait after the first refusal, doubled for
+        every further refusal
+
+    """
+
+    def __init__(self, run, concurrency: int = 16, rate: float = 2,
+                 burst: float = 4, max_retries: int = 4, backoff: float = 2):
+
+        """
+        See help(AsyncCollector) for details
+        """
+
+        self.run = run
+        self.concurrency = concurrency
+        self.limiter = HostLimiter(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.http = run.http_scraper or AmazonUKHttpScraper(pool_size=concurrency)
+
+
+    async def _request(self, url: str, call):
+
+        """This coroutine sends a request through the rate limiter of its
+        host and the global cap, retrying with backoff while it is refused
+
+        Args:
+            url (str): The url requested, which decides the host
+            call (callable): Sends the request in a worker thread and raises
+            Blocked if it was refused
+
+        Returns:
+            The value returned by call
+
+        Raises:
+            Blocked: If the request was still refused after max_retries
+        """
+
+        bucket = self.limiter.bucket(url)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            async with self._slots:
+                try:
+                    result = await loop.run_in_executor(self._executor, call)
+                except Blocked:
+                    pause = self.backoff * 2 ** attempt * random.uniform(1, 1.5)
+                    inc('scraper_blocked_total', host=urlparse(url).netloc)
+                    bucket.penalize(pause)
+                    print(f'Amazon pushed back, slowing down to '
+                          f'{bucket.rate:.2f} requests/s for {urlparse(url).netloc}')
+                    continue
+            bucket.reward()
+            return result
+        raise Blocked(url)
+
+
+    def _get_page(self, url: str):
+        status, page_html = self.http.fetch_response(url)
+        if is_blocked(status, page_html):
+            raise Blocked(url)
+        return page_html if status == 200 else None
+
+
+    async def crawl(self, url: str, max_pages=None):
+
+        """This coroutine follows the pages of a listing
+
+        Args:
+            url (str): The url of the first listing page
+            max_pages (int, None): Maximum number of pages
+
+        Returns:
+            list: The product links of every page, in order
+        """
+
+        links = []
+        pages = 0
+        while url is not None:
+            page_html = await self._request(url, lambda url=url: self._get_page(url))
+            if page_html is None:
+                print(f'Could not download {url}')
+                break
+            page_links, url = ListingCrawler.parse_listing(page_html, url)
+            links.extend(page_links)
+            pages += 1
+            if max_pages is not None and pages >= max_pages:
+                break
+        return list(dict.fromkeys(links))
+
+
+    async def _browser_row(self, link: str):
+
+        """This coroutine scrapes a product with a warm Chrome session of the
+        driver pool, starting new sessions up to the workers setting"""
+
+        if self._scrapers.empty() and self._started < self.run.workers:
+            self._started += 1
+            scraper = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.run._acquire_scraper)
+        else:
+            scraper = await self._scrapers.get()
+
+        def scrape():
+            try:
+                return self.run._scrape_link(scraper, link)
+            except Exception as error:
+                # Only the robot check page slows the host down, any other
+                # error (e.g., a product without an image) skips the product
+                if browser_blocked(scraper.driver):
+                    raise Blocked(link) from error
+                print(f'Could not scrape {link}: {error!r}')
+                inc('scraper_product_failures_total', error=type(error).__name__)
+                return None
+
+        try:
+            return await self._request(link, scrape)
+        finally:
+            self._scrapers.put_nowait(scraper)
+
+
+    async def _product_row(self, link: str):
+
+        """This coroutine scrapes a product over HTTP, falling back to Chrome
+        if a required field is not in the html
+
+        Returns:
+            dict: The product information or None if the product could not be
+            scraped
+        """
+
+        if self.run.http_scraper is None:
+            return await self._browser_row(link)
+
+        def fetch_and_parse():
+            page_html = self._get_page(link)
+            if page_html is None:
+                return None
+            details = self.http.parse(page_html)
+            if missing_required(details):
+                return None
+            return tuple(details[field] for field in FIELD_ORDER)
+
+        try:
+            details = await self._request(link, fetch_and_parse)
+        except Blocked:
+            details = None
+        if details is None:
+            print('Falling back to Selenium for this product')
+            return await self._browser_row(link)
+        return self.run._make_row(link, details)
+
+
+    async def _download_image(self, downloader, row):
+        image_link = row['Image link']
+        await self.limiter.bucket(image_link).acquire()
+        async with self._slots:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, downloader.download,
+                row['Unique Product ID'], image_link)
+
+
+    async def collect(self, links, downloader=None, on_row=None):
+
+        """This coroutine scrapes the products concurrently and downloads
+        the image of every product as soon as it has been scraped
+
+        Args:
+            links (list): The product links to scrape
+            downloader (ImageDownloader, None): Downloads the images
+            on_row (callable, None): Called with every product in the order
+            they are scraped; a product is dropped if it returns False
+
+        Returns:
+            list: The product information, in the order of the links
+        """
+
+        image_tasks = []
+
+        async def scrape(link):
+            try:
+                row = await self._product_row(link)
+            except Blocked:
+                print(f'Gave up on {link} after {self.max_retries} retries')
+                return None
+            if row is None:
+                return None
+            if on_row is not None and on_row(row) is False:
+                return None
+            if downloader is not None:
+                image_tasks.append(asyncio.ensure_future(
+                    self._download_image(downloader, row)))
+            return row
+
+        rows = await asyncio.gather(*(scrape(link) for link in links))
+        await asyncio.gather(*image_tasks)
+        return [row for row in rows if row is not None]
+
+
+    async def __aenter__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency + self.run.workers)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._scrapers = asyncio.Queue()
+        self._scrapers.put_nowait(self.run.scraper)
+        self._started = 1
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        # Every session but the one owned by Run_Scraper goes back to the pool
+        while not self._scrapers.empty():
+            scraper = self._scrapers.get_nowait()
+            if scraper is not self.run.scraper:
+                self.run.pool.release(scraper)
+        self._executor.shutdown(wait=True)
+
+
+def collector_from_env(run):
+
+    """This function builds an AsyncCollector from the async_* environment
+    variables
+
+    Args:
+        run (Run_Scraper): The scraper to collect for
+
+    Returns:
+        AsyncCollector: The collector
+    """
+
+    return AsyncCollector(run,
+                          concurrency=int(os.getenv('async_concurrency', 16)),
+                          rate=float(os.getenv('host_rate', 2)),
+                          burst=float(os.getenv('host_burst', 4)),
+                          max_retries=int(os.getenv('max_retries', 4)),
+                          backoff=float(os.getenv('backoff_seconds', 2)))
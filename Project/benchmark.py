@@ -0,0 +1,592 @@
+# Import all necessary packages
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import boto3
+import pandas as pd
+from botocore.config import Config
+from sqlalchemy import create_engine
+
+from categories import ListingCrawler
+from columnar import ParquetDatasetWriter, pq
+from http_scraper import AmazonUKHttpScraper
+from image_downloader import ImageDownloader
+from main import Run_Scraper
+from rds_loader import BulkLoader
+from s3_sync import S3Sync
+from scraper_module_1 import AmazonUKScraper
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmark_fixtures')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmark_baseline.json')
+
+# A JPEG start and end marker around an image sized body, the image
+# downloader only writes the bytes
+IMAGE_BYTES = b'\xff\xd8\xff\xe0' + bytes(24 * 1024) + b'\xff\xd9'
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return Template(f.read())
+
+
+class ReplayServer():
+
+    """This class serves the saved Amazon pages in benchmark_fixtures from a
+    local HTTP server, hence the scraper can be timed offline and without
+    the noise of the network. Listing pages, product pages and images are
+    generated from the fixtures for any number of products and the server
+    also stands in for S3 (path style PutObject, HeadObject and
+    ListObjectsV2 kept in memory).
+
+    Attributes:
+
+        products (int): Number of products in the listing
+        per_page (int): Number of products on every listing page
+        url (str): The root url of the server e.g., http://127.0.0.1:8000
+
+    """
+
+    def __init__(self, products: int = 100, per_page: int = 50):
+
+        """
+        See help(ReplayServer) for details
+        """
+
+        self.products = products
+        self.per_page = per_page
+        self.objects = {}
+        self.home = _load_fixture('home.html').substitute()
+        self.listing = _load_fixture('listing.html')
+        self.product = _load_fixture('product.html')
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+
+    def start(self):
+
+        """This method serves the pages in a background thread
+
+        Returns:
+            ReplayServer: The server itself
+        """
+
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+
+    def stop(self):
+
+        """This method stops the server"""
+
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def listing_url(self, page: int = 1):
+        return f'{self.url}/Best-Sellers/zgbs/computers?pg={page}'
+
+
+    def listing_page(self, page: int):
+
+        """This method renders a page of the best seller listing
+
+        Args:
+            page (int): The page number, starting from 1
+
+        Returns:
+            str: The html of the page
+        """
+
+        pages = math.ceil(self.products / self.per_page)
+        first = (page - 1) * self.per_page
+        items = []
+        for i in range(first, min(first + self.per_page, self.products)):
+            asin = f'B{i:09d}'
+            items.append(f'<div id="gridItemRoot"><a class="a-link-normal" '
+                         f'href="/Replay-Product-{i}/dp/{asin}/ref=zg_bs_{i}'
+                         f'?pd_rd_i={asin}&amp;psc=1">Replay product {i}</a></div>')
+        if page < pages:
+            next_page = (f'<li class="a-last"><a href="/Best-Sellers/zgbs/'
+                         f'computers?pg={page + 1}">Next page</a></li>')
+        else:
+            next_page = '<li class="a-disabled a-last">Next page</li>'
+        return self.listing.substitute(items='\n'.join(items),
+                                       next_page=next_page)
+
+
+    def product_page(self, asin: str):
+
+        """This method renders the page of a product
+
+        Args:
+            asin (str): The product ID in the url
+
+        Returns:
+            str: The html of the page
+        """
+
+        i = int(asin[1:]) if asin[1:].isdigit() else 0
+        return self.product.substitute(
+            title=f'Replay Wireless Keyboard and Mouse Set {i}',
+            price=f'£{10 + i % 90}.99',
+            brand='Replay',
+            savings=f'-{5 + i % 30}%',
+            image=f'{self.url}/images/{asin}.jpg',
+            rating=f'{3 + (i % 21) / 10:.1f}',
+            count=f'{(i * 37) % 50000 + 1:,}')
+
+
+def _handler(server):
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+
+        # Keep-alive connections as served by Amazon and S3
+        protocol_version = 'HTTP/1.1'
+        # The headers and the body are written separately, which without
+        # TCP_NODELAY stalls every kept-alive response for ~40ms (Nagle and
+        # delayed ACKs) and the benchmark would time the server
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b'', content_type='text/html; charset=utf-8',
+                  headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _body(self):
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0], 16)
+                    if size == 0:
+                        # Skip the trailers up to the empty line
+                        while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                            pass
+                        return b''.join(chunks)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/':
+                self._send(200, server.home.encode())
+            elif url.path.startswith('/Best-Sellers/'):
+                page = int(query.get('pg', ['1'])[0])
+                self._send(200, server.listing_page(page).encode())
+            elif '/dp/' in url.path:
+                asin = url.path.split('/dp/')[1].split('/')[0]
+                self._send(200, server.product_page(asin).encode())
+            elif url.path.startswith('/images/'):
+                self._send(200, IMAGE_BYTES, 'image/jpeg')
+            elif query.get('list-type') == ['2']:
+                self._list_objects(url.path.strip('/'), query)
+            else:
+                self._send(404)
+
+        def _list_objects(self, bucket, query):
+            prefix = query.get('prefix', [''])[0]
+            delimiter = query.get('delimiter', [''])[0]
+            encode = query.get('encoding-type') == ['url']
+            contents = []
+            for (obj_bucket, key), (etag, size) in sorted(server.objects.items()):
+                if obj_bucket != bucket or not key.startswith(prefix):
+                    continue
+                if delimiter and delimiter in key[len(prefix):]:
+                    continue
+                key = quote(key, safe='/') if encode else escape(key)
+                contents.append(f'<Contents><Key>{key}</Key><Size>{size}</Size>'
+                                f'<ETag>"{etag}"</ETag></Contents>')
+            body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                    '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f'<Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix>'
+                    f'<KeyCount>{len(contents)}</KeyCount><MaxKeys>1000</MaxKeys>'
+                    f'<IsTruncated>false</IsTruncated>{"".join(contents)}'
+                    '</ListBucketResult>')
+            self._send(200, body.encode(), 'application/xml')
+
+        def _object(self):
+            bucket, _, key = urlparse(self.path).path.lstrip('/').partition('/')
+            return bucket, unquote(key)
+
+        def do_PUT(self):
+            body = self._body()
+            etag = hashlib.md5(body).hexdigest()
+            server.objects[self._object()] = (etag, len(body))
+            self._send(200, headers={'ETag': f'"{etag}"'})
+
+        def do_HEAD(self):
+            obj = server.objects.get(self._object())
+            if obj is None:
+                self._send(404)
+                return
+            etag, size = obj
+            self.send_response(200)
+            self.send_header('ETag', f'"{etag}"')
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+
+    return ReplayHandler
+
+
+class ReplayRegistry():
+
+    """This class points the scraper at the listing of the replay server
+    instead of looking up the category on Amazon"""
+
+    def __init__(self, server: ReplayServer):
+        self.server = server
+
+    def list_url(self, options: str, items: str):
+        return self.server.listing_url()
+
+
+class Stage():
+
+    """This class collects the time of a single benchmark stage
+
+    Attributes:
+
+        samples (list): Seconds taken by every item of the stage, e.g., every
+        product page
+        items (int, None): Number of items processed, by default the number
+        of samples (or 1 when there are none)
+
+    """
+
+    def __init__(self):
+
+        """
+        See help(Stage) for details
+        """
+
+        self.samples = []
+        self.items = None
+
+
+    @contextmanager
+    def item(self):
+
+        """This context manager adds the time spent inside the with block as
+        a sample"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+
+def percentile(samples, q: float):
+
+    """This function returns a percentile with the nearest rank method
+
+    Args:
+        samples (list): The measured values
+        q (float): The percentile between 0 and 100
+
+    Returns:
+        float: The percentile or None if there are no samples
+    """
+
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def peak_rss_mb():
+
+    """This function returns the peak resident memory of the benchmark and
+    of its child processes (Chrome and chromedriver)
+
+    Returns:
+        dict: The peak RSS in MB of 'self' and 'children'
+    """
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {who: round(resource.getrusage(flag).ru_maxrss / unit, 1)
+            for who, flag in (('self', resource.RUSAGE_SELF),
+                              ('children', resource.RUSAGE_CHILDREN))}
+
+
+class BenchmarkReport():
+
+    """This class times the stages of a benchmark run and compares them
+    with a stored baseline
+
+    Attributes:
+
+        stages (dict): The summary of every stage keyed by its name
+
+    """
+
+    def __init__(self):
+
+        """
+        See help(BenchmarkReport) for details
+        """
+
+        self.stages = {}
+
+
+    @contextmanager
+    def stage(self, name: str):
+
+        """This context manager times a stage
+
+        Args:
+            name (str): The name of the stage e.g., retrieve_details
+        """
+
+        stage = Stage()
+        start = time.perf_counter()
+        yield stage
+        seconds = time.perf_counter() - start
+
+        items = stage.items if stage.items is not None else max(len(stage.samples), 1)
+        p50 = percentile(stage.samples, 50)
+        p95 = percentile(stage.samples, 95)
+        self.stages[name] = {
+            'seconds': round(seconds, 4),
+            'items': items,
+            'per_sec': round(items / seconds, 2) if seconds else None,
+            'p50': None if p50 is None else round(p50, 4),
+            'p95': None if p95 is None else round(p95, 4),
+        }
+
+
+    def to_dict(self):
+        return {'stages': self.stages, 'peak_rss_mb': peak_rss_mb()}
+
+
+    def print_report(self):
+
+        """This method prints a table of the stages"""
+
+        print(f'{"stage":<18}{"seconds":>10}{"items":>8}{"items/s":>10}'
+              f'{"p50 ms":>10}{"p95 ms":>10}')
+        for name, stage in self.stages.items():
+            p50 = '-' if stage['p50'] is None else f'{stage["p50"] * 1000:.1f}'
+            p95 = '-' if stage['p95'] is None else f'{stage["p95"] * 1000:.1f}'
+            print(f'{name:<18}{stage["seconds"]:>10.3f}{stage["items"]:>8}'
+                  f'{stage["per_sec"] or 0:>10.1f}{p50:>10}{p95:>10}')
+        rss = peak_rss_mb()
+        print(f'Peak RSS: {rss["self"]} MB (benchmark), '
+              f'{rss["children"]} MB (largest child process)')
+
+
+    def compare(self, baseline: dict, tolerance: float = 0.2):
+
+        """This method finds the stages which got slower than the baseline by
+        more than the tolerance, either in throughput or in p95 latency
+
+        Args:
+            baseline (dict): A report saved with to_dict
+            tolerance (float): The slowdown allowed e.g., 0.2 for 20%
+
+        Returns:
+            list: A description of every regression
+        """
+
+        regressions = []
+        for name, stage in self.stages.items():
+            base = baseline.get('stages', {}).get(name)
+            if base is None:
+                continue
+            if base['per_sec'] and stage['per_sec'] and \
+                    stage['per_sec'] < base['per_sec'] / (1 + tolerance):
+                regressions.append(f'{name}: {stage["per_sec"]} items/s, '
+                                   f'baseline {base["per_sec"]}')
+            if base['p95'] and stage['p95'] and \
+                    stage['p95'] > base['p95'] * (1 + tolerance):
+                regressions.append(f'{name}: p95 {stage["p95"]}s, '
+                                   f'baseline {base["p95"]}s')
+        base_rss = baseline.get('peak_rss_mb', {}).get('self')
+        rss = peak_rss_mb()['self']
+        if base_rss and rss > base_rss * (1 + tolerance):
+            regressions.append(f'peak RSS: {rss} MB, baseline {base_rss} MB')
+        return regressions
+
+
+def _s3_client(url):
+    # Checksums are only sent when S3 requires them, so the uploads are
+    # plain PutObject requests the stand-in understands
+    try:
+        config = Config(s3={'addressing_style': 'path'},
+                        request_checksum_calculation='when_required')
+    except TypeError:
+        config = Config(s3={'addressing_style': 'path'})
+    return boto3.client('s3', endpoint_url=url, region_name='eu-west-2',
+                        aws_access_key_id='benchmark',
+                        aws_secret_access_key='benchmark', config=config)
+
+
+def run_benchmark(products: int = 100, per_page: int = 50, browser: bool = True,
+                  headless: bool = True, db_url=None):
+
+    """This function replays the fixtures through every stage of the
+    pipeline: driver startup, collecting the links, reading the product
+    pages (with Chrome and over HTTP), downloading the images, writing
+    JSON and Parquet, loading the database and uploading to S3
+
+    Args:
+        products (int): Number of products in the replayed listing
+        per_page (int): Number of products on every listing page
+        browser (bool): Whether to run the Chrome stages
+        headless (bool): Whether Chrome runs headless
+        db_url (str, None): SQLAlchemy url of the database to load, by
+        default a temporary SQLite file; PostgreSQL is loaded with COPY
+
+    Returns:
+        BenchmarkReport: The timings of every stage
+    """
+
+    # The replayed home page has no region to change
+    os.environ['region_change'] = 'no'
+    server = ReplayServer(products, per_page).start()
+    report = BenchmarkReport()
+    http = AmazonUKHttpScraper()
+
+    try:
+        with tempfile.TemporaryDirectory() as work:
+            rows = []
+            if browser:
+                with report.stage('driver_startup'):
+                    scraper = AmazonUKScraper('best seller', 'computers',
+                                              server.url + '/', headless,
+                                              create_dir=False)
+                scraper.registry = ReplayRegistry(server)
+                try:
+                    with report.stage('get_all_links') as stage:
+                        links = scraper._get_all_links()
+                        stage.items = len(links)
+
+                    with report.stage('retrieve_details') as stage:
+                        for link in links:
+                            with stage.item():
+                                scraper.driver.get(link)
+                                scraper._wait_for_product_page()
+                                details = scraper.retrieve_details_from_a_page()
+                            rows.append(Run_Scraper._make_row(link, details))
+                finally:
+                    scraper.driver.quit()
+            else:
+                with report.stage('get_all_links') as stage:
+                    links = ListingCrawler(http=http).crawl(server.listing_url())
+                    stage.items = len(links)
+
+            with report.stage('http_details') as stage:
+                for link in links:
+                    with stage.item():
+                        details = http.retrieve_details(link)
+                    if not browser and details is not None:
+                        rows.append(Run_Scraper._make_row(link, details))
+
+            df = pd.DataFrame(rows)
+
+            with report.stage('image_download') as stage:
+                image_dir = os.path.join(work, 'images')
+                os.makedirs(image_dir)
+                ImageDownloader(image_dir).download_all(
+                    df['Unique Product ID'], df['Image link'])
+                stage.items = len(df)
+
+            with report.stage('json_write') as stage:
+                df.to_json(os.path.join(work, 'data.json'))
+                stage.items = len(df)
+
+            if pq is not None:
+                with report.stage('parquet_write') as stage:
+                    ParquetDatasetWriter(os.path.join(work, 'products')).write(
+                        df, 'best_seller')
+                    stage.items = len(df)
+
+            engine = create_engine(db_url or f'sqlite:///{work}/benchmark.sqlite')
+            with report.stage('db_load') as stage:
+                if engine.dialect.name == 'postgresql':
+                    BulkLoader(engine).load(df, 'benchmark_products')
+                else:
+                    df.to_sql('benchmark_products', engine, if_exists='append',
+                              chunksize=60)
+                stage.items = len(df)
+            engine.dispose()
+
+            with report.stage('s3_upload') as stage:
+                sync = S3Sync(_s3_client(server.url), 'benchmark')
+                stage.items = sync.sync(image_dir, 'raw_data/images/')
+    finally:
+        server.stop()
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Replay saved Amazon pages through the scraper and time '
+                    'every stage against a stored baseline')
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--no-browser', action='store_true',
+                        help='skip the Chrome stages')
+    parser.add_argument('--show-browser', action='store_true',
+                        help='run Chrome with a window')
+    parser.add_argument('--db-url', help='database to load, by default a '
+                        'temporary SQLite file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown allowed before a stage is reported')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.products, args.per_page,
+                           browser=not args.no_browser,
+                           headless=not args.show_browser, db_url=args.db_url)
+    report.print_report()
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+        print(f'Saved the baseline to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = report.compare(json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Regression {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline')
+    else:
+        # Timings depend on the machine, hence no baseline is committed
+        print(f'No baseline at {args.baseline}, run with --save-baseline on '
+              'a known good commit to compare later runs against it')
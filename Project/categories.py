@@ -0,0 +1,299 @@
+# Import all necessary packages
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+from http_scraper import AmazonUKHttpScraper
+
+
+BASE_URL = 'https://www.amazon.co.uk'
+
+# Root of the best seller navigation tree listing every department
+ZGBS_ROOT = BASE_URL + '/Best-Sellers/zgbs'
+
+# Listing page of a product list given the slug of a category
+LIST_URLS = {
+
+    'best seller': BASE_URL + '/Best-Sellers/zgbs/{slug}',
+    'most wished for': BASE_URL + '/gp/most-wished-for/{slug}',
+}
+
+# Names used by the scraper which differ from the names in the navigation
+ALIASES = {
+
+    'computer & accessories': 'computers',
+}
+
+
+class CategoryRegistry():
+
+    """This class knows the slug of every Amazon UK best seller department
+    (e.g., 'Computers & Accessories' -> 'computers'). The departments are
+    discovered from the zgbs navigation tree and cached in a local JSON
+    file which is refreshed after ttl_hours.
+
+    Attributes:
+
+        http (AmazonUKHttpScraper): Downloads the navigation page
+        path (str): The JSON file the departments are cached in
+        ttl_hours (float): Age after which the departments are discovered
+        again
+
+    """
+
+    def __init__(self, http=None, path: str = 'categories.json',
+                 ttl_hours: float = 168):
+
+        """
+        See help(CategoryRegistry) for details
+        """
+
+        self.http = http or AmazonUKHttpScraper()
+        self.path = path
+        self.ttl_hours = ttl_hours
+        self._categories = None
+
+
+    def categories(self):
+
+        """This method returns the departments from the cache, discovering
+        them again if the cache is missing or stale
+
+        Returns:
+            dict: The slug of every department keyed by its lower case name
+        """
+
+        if self._categories is not None:
+            return self._categories
+
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+            if time.time() - cached['discovered'] < self.ttl_hours * 3600:
+                self._categories = cached['categories']
+                return self._categories
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._categories = self.discover()
+        with open(self.path, 'w') as f:
+            json.dump({'discovered': time.time(),
+                       'categories': self._categories}, f)
+        return self._categories
+
+
+    def discover(self):
+
+        """This method reads the departments from the navigation tree
+
+        Returns:
+            dict: The slug of every department keyed by its lower case name
+
+        Raises:
+            RuntimeError: If the navigation page could not be downloaded
+        """
+
+        page_html = self.http.fetch(ZGBS_ROOT)
+        if page_html is None:
+            raise RuntimeError('Could not download the best seller departments')
+
+        tree = lxml_html.fromstring(page_html)
+        categories = {}
+        for a_tag in tree.xpath('//div[@role="tree"]//a[contains(@href, "/zgbs/")]'):
+            slug = a_tag.get('href').split('/zgbs/')[1].split('/')[0]
+            name = a_tag.text_content().strip().lower()
+            if slug and name:
+                categories[name] = slug
+        return categories
+
+
+    def slug(self, items: str):
+
+        """This method looks up the slug of a department
+
+        Args:
+            items (str): Name of the department e.g., "Computer & Accessories"
+
+        Returns:
+            str: The slug used in the listing urls
+
+        Raises:
+            ValueError: If there is no such department
+        """
+
+        items = items.lower()
+        if items in ALIASES:
+            return ALIASES[items]
+        categories = self.categories()
+        if items in categories:
+            return categories[items]
+        if items in categories.values():
+            return items
+        raise ValueError(f'Unknown category: {items}')
+
+
+    def list_url(self, options: str, items: str):
+
+        """This method builds the url of the first listing page
+
+        Args:
+            options (str): Best Seller/Most Wished For
+            items (str): Name of the department
+
+        Returns:
+            str: The url of the listing page
+        """
+
+        return LIST_URLS[options.lower()].format(slug=self.slug(items))
+
+
+class ListingCrawler():
+
+    """This class collects the product links of many listing pages over
+    HTTP, crawling several categories at the same time and following the
+    next page button of every category until there is none.
+
+    Attributes:
+
+        http (AmazonUKHttpScraper): Downloads the listing pages
+        workers (int): Number of categories crawled at the same time
+        max_pages (int, None): Maximum number of pages per category
+
+    """
+
+    def __init__(self, http=None, workers: int = 8, max_pages=None):
+
+        """
+        See help(ListingCrawler) for details
+        """
+
+        self.http = http or AmazonUKHttpScraper(pool_size=workers)
+        self.workers = workers
+        self.max_pages = max_pages
+
+
+    @staticmethod
+    def parse_listing(page_html, page_url, rendered: bool = False):
+
+        """This method reads the product links and the next page of a listing
+        page. Only the first products of a page are rendered without
+        javascript but the ids of all of them are embedded in the
+        data-client-recs-list attribute, which is used when present.
+
+        Args:
+            page_html (str): The html of the listing page
+            page_url (str): The url of the listing page
+            rendered (bool): Whether the html is the page source of Chrome,
+            where every product is rendered, in which case the first link of
+            every product is read as AmazonUKScraper._get_links_per_page does
+
+        Returns:
+            tuple: The list of product links and the url of the next page or
+            None on the last page
+        """
+
+        tree = lxml_html.fromstring(page_html)
+        next_page = tree.xpath('//li[@class="a-last"]/a/@href')
+        next_url = urljoin(page_url, next_page[0]) if next_page else None
+        if rendered:
+            links = [urljoin(page_url, href[0]) for href in
+                     (item.xpath('(.//a)[1]/@href')
+                      for item in tree.xpath('//div[@id="gridItemRoot"]'))
+                     if href]
+            return links, next_url
+
+        links = []
+        for recs in tree.xpath('//div[@data-client-recs-list]/@data-client-recs-list'):
+            try:
+                links.extend(f'{BASE_URL}/dp/{rec["id"]}' for rec in json.loads(recs))
+            except (ValueError, KeyError, TypeError):
+                continue
+        if not links:
+            links = [urljoin(page_url, href) for href in tree.xpath(
+                '//div[@id="gridItemRoot"]//a[contains(@href, "/dp/")]/@href')]
+
+        return list(dict.fromkeys(links)), next_url
+
+
+    def crawl(self, url: str):
+
+        """This method follows the pages of one listing
+
+        Args:
+            url (str): The url of the first listing page
+
+        Returns:
+            list: The product links of every page, in order
+        """
+
+        links = []
+        pages = 0
+        while url is not None:
+            page_html = self.http.fetch(url)
+            if page_html is None:
+                print(f'Could not download {url}')
+                break
+            page_links, url = self.parse_listing(page_html, url)
+            links.extend(page_links)
+            pages += 1
+            if self.max_pages is not None and pages >= self.max_pages:
+                break
+        return list(dict.fromkeys(links))
+
+
+    def crawl_many(self, urls):
+
+        """This method crawls many listings at the same time
+
+        Args:
+            urls (list): The urls of the first page of every listing
+
+        Returns:
+            dict: The product links of every listing keyed by its url
+        """
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(urls, pool.map(self.crawl, urls)))
+
+
+def crawl_categories(list_types, names=None, registry=None, crawler=None):
+
+    """This function collects the product links of several product lists in
+    several (by default all) departments concurrently
+
+    Args:
+        list_types (list): e.g., ['best seller', 'most wished for']
+        names (list, None): Department names, every department if None
+        registry (CategoryRegistry, None): Registry of the departments
+        crawler (ListingCrawler, None): Crawler of the listing pages
+
+    Returns:
+        dict: The product links keyed by (list type, department name)
+    """
+
+    registry = registry or CategoryRegistry()
+    crawler = crawler or ListingCrawler(
+        workers=int(os.getenv('crawl_workers', 8)))
+    if names is None:
+        names = list(registry.categories())
+
+    urls = {(options, items): registry.list_url(options, items)
+            for options in list_types for items in names}
+    links = crawler.crawl_many(list(urls.values()))
+    return {key: links[url] for key, url in urls.items()}
+
+
+if __name__ == '__main__':
+
+    start = time.perf_counter()
+    all_links = crawl_categories(['best seller', 'most wished for'])
+    with open('category_links.json', 'w') as f:
+        json.dump({f'{options}|{items}': links
+                   for (options, items), links in all_links.items()}, f)
+    print(f'Found {sum(map(len, all_links.values()))} links in '
+          f'{len(all_links)} listings in {time.perf_counter() - start:.0f}s')
@@ -0,0 +1,163 @@
+# Import all necessary packages
+
+import json
+import os
+import time
+
+
+class CheckpointJournal():
+
+    """This class keeps an append-only JSON lines journal of a run in the
+    raw_data directory. The first line holds the product links returned by
+    _get_all_links and every following line a product which was scraped. If
+    Chrome crashes or a page hangs, the next run reads the journal, reuses
+    the links and skips the products already scraped. A journal older than
+    max_age_hours is stale and ignored. Only the links of the products
+    already scraped are kept in memory, the products themselves are read
+    back from the journal when they are needed (see help(resumed)).
+
+    Attributes:
+
+        path (str): The path of the journal file
+        max_age_hours (float): Age after which a journal is no longer resumed
+        links (list, None): The links of the interrupted run, None when there
+        is nothing to resume
+        completed (set): The page links of the products already scraped
+
+    """
+
+    def __init__(self, path: str, max_age_hours: float = 12):
+
+        """
+        See help(CheckpointJournal) for details
+        """
+
+        self.path = path
+        self.max_age_hours = max_age_hours
+        self.links = None
+        self.completed = set()
+        self.file = None
+        self._load()
+
+
+    def _load(self):
+
+        """This method reads an existing journal. A half written last line,
+        e.g., when the process was killed while writing it, is ignored and
+        cut off, hence the next record starts on a line of its own.
+        """
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            lines = f.readlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = None
+        if header is None or not lines[0].endswith('\n'):
+            os.remove(self.path)
+            return
+
+        age_hours = (time.time() - header['created']) / 3600
+        if age_hours > self.max_age_hours:
+            print(f'Ignoring checkpoint from {age_hours:.1f} hours ago')
+            os.remove(self.path)
+            return
+
+        self.links = header['links']
+        complete = len(lines[0])
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith('\n'):
+                break
+            self.completed.add(record['Page Link'])
+            complete += len(line)
+
+        if complete < sum(len(line) for line in lines):
+            # Everything after the last complete record is dropped
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(''.join(lines)[:complete].encode()))
+
+
+    def start(self, links: list):
+
+        """This method starts a new journal for the given links, unless the
+        journal of an interrupted run is being resumed
+
+        Args:
+            links (list): The links of the products of the run
+        """
+
+        if self.links is None:
+            self.links = links
+            self.file = open(self.path, 'w')
+            self._append({'created': time.time(), 'links': links})
+        else:
+            self.file = open(self.path, 'a')
+
+
+    def record(self, record: dict):
+
+        """This method writes a scraped product to disk before it is used
+
+        Args:
+            record (dict): The product information of a single product
+        """
+
+        self.completed.add(record['Page Link'])
+        self._append(record)
+
+
+    def resumed(self, links: list = None):
+
+        """This generator reads the products already scraped back from the
+        journal one at a time
+
+        Args:
+            links (list, None): Only yield the products of these links, every
+            product if None
+
+        Yields:
+            dict: The product information of a single product
+        """
+
+        if not self.completed or not os.path.exists(self.path):
+            return
+        wanted = self.completed if links is None else self.completed.intersection(links)
+        yielded = set()
+        with open(self.path) as f:
+            next(f)
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                link = record['Page Link']
+                if link in wanted and link not in yielded:
+                    yielded.add(link)
+                    yield record
+
+
+    def _append(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
+    def finish(self):
+
+        """This method removes the journal once the products of the run have
+        been saved, hence the next run starts from scratch
+        """
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.links = None
+        self.completed = set()
@@ -0,0 +1,142 @@
+# Import all necessary packages
+
+import datetime
+import os
+import uuid
+
+import pandas as pd
+
+from product_record import parse_price, parse_rating, parse_count
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the Parquet output
+    pa = None
+    pq = None
+
+
+# Type of every column written to Parquet, the text columns stay strings
+COLUMN_TYPES = {
+
+    'Price': 'float64',
+    'Review Ratings': 'float64',
+    'Global Ratings': 'Int64',
+}
+
+
+_PARSERS = {
+
+    'Price': parse_price,
+    'Review Ratings': parse_rating,
+    'Global Ratings': parse_count,
+}
+
+
+def typed_frame(df: pd.DataFrame):
+
+    """This function converts the scraped text of the numeric columns to
+    numbers. Values which can not be read, e.g., 'N/A' or 'No rating',
+    become missing values.
+
+    Args:
+        df (DataFrame): The product information as scraped
+
+    Returns:
+        DataFrame: A copy with numeric price, rating and review count columns
+    """
+
+    df = df.copy()
+    for column, parser in _PARSERS.items():
+        if column in df:
+            df[column] = df[column].map(parser).astype(COLUMN_TYPES[column])
+    return df
+
+
+class ParquetDatasetWriter():
+
+    """This class appends the products of every run to a Parquet dataset
+    partitioned by date and product list, e.g.,
+    products/date=2022-05-01/category=best_seller/part-<id>.parquet, hence
+    earlier runs are never overwritten and readers can skip partitions and
+    read only the columns they need.
+
+    Attributes:
+
+        root (str): The directory of the dataset
+        compression (str): The Parquet compression codec
+
+    """
+
+    def __init__(self, root: str, compression: str = 'snappy'):
+
+        """
+        See help(ParquetDatasetWriter) for details
+        """
+
+        if pq is None:
+            raise ImportError('Parquet output needs pyarrow, install it with '
+                              'pip install pyarrow')
+        self.root = root
+        self.compression = compression
+
+
+    def partition_dir(self, category: str, date=None):
+
+        """This method returns the directory of a partition
+
+        Args:
+            category (str): The product list e.g., best_seller
+            date (datetime.date, None): The date of the run, by default today
+
+        Returns:
+            str: The path of the partition directory
+        """
+
+        date = date or datetime.date.today()
+        return os.path.join(self.root, f'date={date.isoformat()}',
+                            f'category={category}')
+
+
+    def write(self, rows, category: str):
+
+        """This method writes products as a new file of today's partition
+
+        Args:
+            rows (DataFrame, list, dict): The product information
+            category (str): The product list e.g., best_seller
+
+        Returns:
+            str: The path of the file written, relative to the dataset root
+        """
+
+        df = typed_frame(pd.DataFrame(rows))
+        directory = self.partition_dir(category)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{uuid.uuid4().hex}.parquet')
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, path + '.part', compression=self.compression)
+        os.replace(path + '.part', path)
+        return os.path.relpath(path, self.root)
+
+
+def read_products(root: str, columns=None, filters=None):
+
+    """This function reads the Parquet dataset memory-mapped, e.g.,
+    read_products('products', ['Price'], [('category', '=', 'best_seller')])
+
+    Args:
+        root (str): The directory of the dataset
+        columns (list, None): Only read these columns, by default all of them
+        filters (list, None): Partition filters as understood by pyarrow
+
+    Returns:
+        DataFrame: The products
+    """
+
+    if pq is None:
+        raise ImportError('Reading Parquet needs pyarrow, install it with '
+                          'pip install pyarrow')
+    return pq.read_table(root, columns=columns, filters=filters,
+                         memory_map=True).to_pandas()
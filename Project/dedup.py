@@ -0,0 +1,209 @@
+# Import all necessary packages
+
+import sqlite3
+from sqlalchemy import text
+
+from metrics import instrument
+
+
+class DedupIndex():
+
+    """This class keeps the product IDs which were already scraped for a
+    product list (best seller/most wished for) in an in-memory set backed by
+    a SQLite file in the raw_data directory. The file is loaded once per run
+    and updated after every upload so the IDs do not have to be pulled from
+    AWS RDS again. Lookups are exact matches.
+
+    Attributes:
+
+        table (str): The RDS table the product IDs belong to e.g., best_seller
+        path (str): The SQLite file storing the index
+        ids (set): The product IDs already scraped
+
+    """
+
+    def __init__(self, table: str, path: str = 'dedup_index.sqlite'):
+
+        """
+        See help(DedupIndex) for details
+        """
+
+        self.table = table
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS seen_products (
+                           category TEXT NOT NULL,
+                           product_id TEXT NOT NULL,
+                           PRIMARY KEY (category, product_id))''')
+        self.ids = {row[0] for row in self.db.execute(
+            'SELECT product_id FROM seen_products WHERE category = ?', (table,))}
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def __contains__(self, product_id):
+        return product_id in self.ids
+
+
+    @instrument
+    def seen(self, product_ids):
+
+        """This method returns which of the given product IDs were already
+        scraped
+
+        Args:
+            product_ids (iterable): The candidate product IDs
+
+        Returns:
+            set: The product IDs present in the index
+        """
+
+        return {product_id for product_id in product_ids
+                if product_id in self.ids}
+
+
+    @instrument
+    def add(self, product_ids):
+
+        """This method adds newly uploaded product IDs to the index
+
+        Args:
+            product_ids (iterable): The product IDs to add
+        """
+
+        new_ids = set(product_ids) - self.ids
+        if not new_ids:
+            return
+        with self.db:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO seen_products VALUES (?, ?)',
+                [(self.table, product_id) for product_id in new_ids])
+        self.ids.update(new_ids)
+
+
+    def bootstrap(self, conn):
+
+        """This method fills an empty index with the product IDs already
+        stored in RDS. It only needs to run once, afterwards the index is
+        kept up to date by add.
+
+        Args:
+            conn (Connection): SQLAlchemy connection to the RDS database
+        """
+
+        query = text(f'SELECT "Unique Product ID" FROM {self.table}')
+        try:
+            product_ids = [row[0] for row in conn.execute(query)]
+        except Exception:
+            print("No data present in pgadmin")
+            return
+        self.add(product_ids)
+
+
+    def rebuild(self, conn):
+
+        """This method empties the index and fills it from RDS again, e.g.,
+        after the product IDs stored in RDS were rewritten
+
+        Args:
+            conn (Connection): SQLAlchemy connection to the RDS database
+        """
+
+        with self.db:
+            self.db.execute('DELETE FROM seen_products WHERE category = ?',
+                            (self.table,))
+        self.ids = set()
+        self.bootstrap(conn)
+
+
+class DatabaseDedup():
+
+    """This class leaves the deduplication to PostgreSQL. Instead of pulling
+    every product ID of a table over the network, the candidate IDs of a run
+    are sent in one query and only the ones already stored are returned. The
+    product ID column is indexed so the cost of a run does not grow with the
+    size of the table.
+
+    Attributes:
+
+        table (str): The RDS table the product IDs belong to e.g., best_seller
+        engine (Engine): SQLAlchemy engine connected to the RDS database
+
+    """
+
+    def __init__(self, table: str, engine):
+
+        """
+        See help(DatabaseDedup) for details
+        """
+
+        self.table = table
+        self.engine = engine
+        self.indexed = False
+
+
+    def ensure_index(self):
+
+        """This method creates an index on the product ID column if it is
+        missing. The index is not unique, as runs with start_empty='yes' 
+        append products which are already stored. Nothing is done while the
+        table does not exist yet.
+        """
+
+        with self.engine.connect() as conn:
+            exists = conn.execute(text('SELECT to_regclass(:table)'),
+                                  {'table': self.table}).scalar()
+        if exists is None:
+            return
+        self.indexed = True
+
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_product_id_idx '
+                f'ON {self.table} ("Unique Product ID")'))
+
+
+    @instrument
+    def seen(self, product_ids):
+
+        """This method asks the database which of the given product IDs are
+        already stored
+
+        Args:
+            product_ids (iterable): The candidate product IDs
+
+        Returns:
+            set: The product IDs present in the table
+        """
+
+        product_ids = list(set(product_ids))
+        if not product_ids:
+            return set()
+        query = text(f'SELECT "Unique Product ID" FROM {self.table} '
+                     f'WHERE "Unique Product ID" = ANY(:ids)')
+        try:
+            with self.engine.connect() as conn:
+                return {row[0] for row in conn.execute(query, {'ids': product_ids})}
+        except Exception:
+            print("No data present in pgadmin")
+            return set()
+
+
+    def __contains__(self, product_id):
+        return bool(self.seen([product_id]))
+
+
+    @instrument
+    def add(self, product_ids):
+
+        """Uploaded rows are already in the table, hence the only thing left
+        to do is indexing a table which was created by the first upload
+
+        Args:
+            product_ids (iterable): The product IDs which were uploaded
+        """
+
+        if not self.indexed:
+            self.ensure_index()
@@ -0,0 +1,231 @@
+# Import all necessary packages
+
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+# Resolved chromedriver path shared by every scraper of the process
+_driver_path = None
+_driver_lock = threading.Lock()
+
+_shared_pools = {}
+_pools_lock = threading.Lock()
+
+
+def chromedriver_path(cache_file: str = os.path.join(
+        os.path.expanduser('~'), '.cache', 'amazon_scraper', 'chromedriver.json')):
+
+    """This function resolves the chromedriver executable once per process
+    and caches its path on disk, hence ChromeDriverManager (which may look up
+    the latest version over the network) is only used when the cached path is
+    missing or older than driver_cache_hours.
+
+    Args:
+        cache_file (str): The file the resolved path is cached in
+
+    Returns:
+        str: The path of the chromedriver executable
+    """
+
+    global _driver_path
+    with _driver_lock:
+        if _driver_path is not None:
+            return _driver_path
+
+        max_age = float(os.getenv('driver_cache_hours', 24)) * 3600
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if (time.time() - cached['resolved'] < max_age
+                    and os.path.exists(cached['path'])):
+                _driver_path = cached['path']
+                return _driver_path
+        except (OSError, ValueError, KeyError):
+            pass
+
+        _driver_path = ChromeDriverManager().install()
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump({'path': _driver_path, 'resolved': time.time()}, f)
+        return _driver_path
+
+
+def profile_is_warm(profile_dir: str):
+
+    """This function checks whether a persistent Chrome profile already has
+    the cookies accepted and the region set, within profile_max_age_hours
+
+    Args:
+        profile_dir (str): The Chrome user data directory
+
+    Returns:
+        bool: True if the profile can be used without setting it up again
+    """
+
+    max_age = float(os.getenv('profile_max_age_hours', 24)) * 3600
+    try:
+        with open(os.path.join(profile_dir, 'scraper_warm.json')) as f:
+            return time.time() - json.load(f)['configured'] < max_age
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def mark_profile_warm(profile_dir: str):
+
+    """This function records that a Chrome profile has been set up
+
+    Args:
+        profile_dir (str): The Chrome user data directory
+    """
+
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(os.path.join(profile_dir, 'scraper_warm.json'), 'w') as f:
+        json.dump({'configured': time.time()}, f)
+
+
+class DriverPool():
+
+    """This class keeps browser sessions which already have cookies accepted
+    and the region set, so they can be reused across product lists and
+    categories instead of launching and setting up a new Chrome every time.
+    When a profile root is given, every session gets its own persistent
+    Chrome profile below it, hence the setup also survives between runs.
+    Chrome refuses to start on a profile another Chrome is using, hence a
+    profile is locked while its session lives and sessions of other 
+    processes on the same host, e.g., a second run or a worker next to its
+    coordinator, take the next free profile.
+
+    Attributes:
+
+        factory (callable): Builds a new scraper given its profile directory
+        (or None)
+        profile_root (str, None): Directory holding one Chrome profile per
+        session
+
+    """
+
+    def __init__(self, factory, profile_root=None):
+
+        """
+        See help(DriverPool) for details
+        """
+
+        self.factory = factory
+        self.profile_root = profile_root
+        self.idle = []
+        self.scrapers = []
+        self._profile_locks = []
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+
+        """This method hands out an idle session or starts a new one
+
+        Returns:
+            AmazonUKScraper: A scraper nobody else is using
+        """
+
+        with self._lock:
+            if self.idle:
+                return self.idle.pop()
+
+        profile_dir = None
+        if self.profile_root:
+            profile_dir = self._claim_profile()
+        scraper = self.factory(profile_dir)
+        with self._lock:
+            self.scrapers.append(scraper)
+        return scraper
+
+
+    def _claim_profile(self):
+
+        """This method locks the first profile below profile_root which no
+        session of this or another process is using. The lock is released
+        by close or when the process exits.
+
+        Returns:
+            str: The profile directory of the new session
+        """
+
+        os.makedirs(self.profile_root, exist_ok=True)
+        if fcntl is None:
+            # Without file locks every process keeps profiles of its own
+            with self._lock:
+                session_id = len(self._profile_locks)
+                self._profile_locks.append(None)
+            return os.path.join(self.profile_root,
+                                f'session_{os.getpid()}_{session_id}')
+
+        session_id = 0
+        while True:
+            profile_dir = os.path.join(self.profile_root, f'session_{session_id}')
+            lock = open(profile_dir + '.lock', 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                session_id += 1
+                continue
+            with self._lock:
+                self._profile_locks.append(lock)
+            return profile_dir
+
+
+    def release(self, scraper):
+
+        """This method puts a session back in the pool, still warm
+
+        Args:
+            scraper (AmazonUKScraper): A scraper returned by acquire
+        """
+
+        with self._lock:
+            self.idle.append(scraper)
+
+
+    def close(self):
+
+        """This method quits every browser of the pool"""
+
+        with self._lock:
+            scrapers, self.scrapers, self.idle = self.scrapers, [], []
+            locks, self._profile_locks = self._profile_locks, []
+        for scraper in scrapers:
+            scraper.driver.quit()
+        # The profiles can be used by other processes again
+        for lock in locks:
+            if lock is not None:
+                lock.close()
+
+
+def shared_pool(key, factory, profile_root=None):
+
+    """This function returns the pool shared by every Run_Scraper of the
+    process with the same key, e.g., headless or not, creating it if needed
+
+    Args:
+        key (hashable): Sessions are only shared between equal keys
+        factory (callable): Builds a new scraper given its profile directory
+        profile_root (str, None): Directory holding one Chrome profile per
+        session
+
+    Returns:
+        DriverPool: The shared pool
+    """
+
+    with _pools_lock:
+        if key not in _shared_pools:
+            _shared_pools[key] = DriverPool(factory, profile_root)
+        return _shared_pools[key]
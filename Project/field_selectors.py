@@ -0,0 +1,195 @@
+# XPath fallback chains shared by every engine that reads a product page
+
+from collections import namedtuple
+
+
+# A selector is one place on the page where a field may be found. When
+# attribute is None the visible text of the element is used, otherwise the
+# value of that attribute. The transform (if any) is looked up in TRANSFORMS.
+Selector = namedtuple('Selector', ['xpath', 'attribute', 'transform'])
+Selector.__new__.__defaults__ = (None, None)
+
+
+# Different products show the same information in different places on the
+# page and hence every field has a chain of selectors which are tried in order
+# until one of them is found
+FIELD_SELECTORS = {
+
+    'title': [
+        Selector('//span[@id="productTitle"]'),
+    ],
+    'price': [
+        Selector('//span[@class="a-price a-text-price header-price a-size-base a-text-normal"]'),
+        Selector('//span[@class="a-size-medium a-color-price priceBlockBuyingPriceString"]', transform='newline_to_dot'),
+        Selector('//span[@class="a-price aok-align-center reinventPricePriceToPayMargin priceToPay"]', transform='newline_to_dot'),
+        Selector('//td[@class="a-span12"]'),
+        Selector('//span[@data-maple-math="cost"]'),
+    ],
+    'brand': [
+        Selector('//tr[@class="a-spacing-small po-brand"]', transform='second_word'),
+    ],
+    'voucher': [
+        Selector('//span[@class="promoPriceBlockMessage"]', transform='second_line'),
+        Selector('//div[@data-csa-c-slot-id="promo-cxcw-0-0"]'),
+    ],
+    'price_override': [
+        Selector('//span[@class="a-size-large a-color-price savingPriceOverride aok-align-center reinventPriceSavingsPercentageMargin savingsPercentage"]'),
+        Selector('//td[@class="a-span12 a-color-price a-size-basepriceBlockSavingsString"]'),
+        Selector('//td[@class="a-span12 a-color-price a-size-base"]'),
+    ],
+    'review_ratings': [
+        Selector('//span[@class="a-size-medium a-color-base"]'),
+    ],
+    'global_ratings': [
+        Selector('//div[@data-hook="total-review-count"]'),
+    ],
+    'topics_review': [
+        Selector('//div[@class="cr-lighthouse-terms"]'),
+    ],
+    'review_helpful': [
+        Selector('//div[@id="cm-cr-dp-review-list"]/div[@data-hook="review"]//span[@data-hook="review-body"]'),
+    ],
+    'src': [
+        Selector('//div[@class="imgTagWrapper"]//img', attribute='src'),
+    ],
+}
+
+
+# Values used when none of the selectors of a field are found on the page.
+# The main image has no default as every product page is expected to have one
+FIELD_DEFAULTS = {
+
+    'title': 'N/A',
+    'price': 'N/A',
+    'brand': 'N/A',
+    'voucher': 'N/A',
+    'price_override': 'N/A',
+    'review_ratings': 'No rating',
+    'global_ratings': 'No global rating',
+    'topics_review': 'No review topics',
+    'review_helpful': 'No most helpful review',
+    'src': None,
+}
+
+
+# The order of the tuple returned by retrieve_details_from_a_page
+FIELD_ORDER = ('title', 'price', 'brand', 'voucher', 'price_override',
+               'review_ratings', 'global_ratings', 'topics_review',
+               'review_helpful', 'src')
+
+
+# If any of these are missing the page was not read correctly
+REQUIRED_FIELDS = ('title', 'price', 'src')
+
+
+TRANSFORMS = {
+
+    'newline_to_dot': lambda text: text.replace('\n', '.'),
+    'second_word': lambda text: text.split(' ')[1],
+    'second_line': lambda text: text.split('\n')[1],
+}
+
+
+def apply_transform(selector, value):
+
+    """This function applies the transform of a selector to the value read
+    from the page. An IndexError means the element did not have the expected
+    shape and the next selector of the chain should be tried.
+
+    Args:
+        selector (Selector): The selector the value was read with
+        value (str): The text or attribute value of the element
+
+    Returns:
+        str: The transformed value
+    """
+
+    if selector.transform is None:
+        return value
+    return TRANSFORMS[selector.transform](value)
+
+
+def missing_required(details):
+
+    """This function checks a dictionary of field values for required fields
+    which were not found on the page.
+
+    Args:
+        details (dict): The field values keyed by field name
+
+    Returns:
+        list: The names of the required fields which are missing
+    """
+
+    return [field for field in REQUIRED_FIELDS
+            if details.get(field) in (None, FIELD_DEFAULTS[field])]
+
+
+def selector_chains(chains=None):
+
+    """This function converts the selector chains into plain lists which can
+    be sent to the browser as an argument of execute_script
+
+    Args:
+        chains (dict, None): The Selectors of every field in the order they
+        should be tried, by default FIELD_SELECTORS
+
+    Returns:
+        dict: [xpath, attribute, transform] lists keyed by field name
+    """
+
+    chains = chains or FIELD_SELECTORS
+    return {field: [list(selector) for selector in chains[field]]
+            for field in FIELD_ORDER}
+
+
+# Runs every selector chain inside the browser in a single execute_script
+# call. The transforms mirror TRANSFORMS; a transform which fails moves on to
+# the next selector just like the IndexError does on the Python side.
+# Returns the value of every field (null when nothing was found) and the
+# index of the selector that matched.
+BATCH_EXTRACT_JS = """
+var chains = arguments[0];
+var transforms = {
+    newline_to_dot: function (text) { return text.split('\\n').join('.'); },
+    second_word: function (text) {
+        var parts = text.split(' ');
+        if (parts.length < 2) { throw new Error('index'); }
+        return parts[1];
+    },
+    second_line: function (text) {
+        var parts = text.split('\\n');
+        if (parts.length < 2) { throw new Error('index'); }
+        return parts[1];
+    }
+};
+var values = {};
+var matched = {};
+for (var field in chains) {
+    values[field] = null;
+    matched[field] = null;
+    for (var i = 0; i < chains[field].length; i++) {
+        var selector = chains[field][i];
+        var node = document.evaluate(selector[0], document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (!node) { continue; }
+        var value;
+        if (selector[1] === null) {
+            value = (node.innerText || '').trim();
+        } else if (selector[1] in node) {
+            value = node[selector[1]];
+        } else {
+            value = node.getAttribute(selector[1]);
+        }
+        try {
+            if (selector[2] !== null) { value = transforms[selector[2]](value); }
+        } catch (error) {
+            continue;
+        }
+        values[field] = value;
+        matched[field] = i;
+        break;
+    }
+}
+return {values: values, matched: matched};
+"""
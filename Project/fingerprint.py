@@ -0,0 +1,112 @@
+# Import all necessary packages
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+# Columns of the product dictionary which make up the content of a product
+CONTENT_COLUMNS = ('Title', 'Price', 'Brand', 'Savings/Promotion', 'Voucher',
+                   'Review Ratings', 'Global Ratings', 'Topics in Reviews',
+                   'Most Helpful Review', 'Image link')
+
+# The cheap probe only reads these fields (see field_selectors.py) and the
+# matching columns of the product dictionary
+PROBE_FIELDS = ('price', 'review_ratings', 'global_ratings')
+PROBE_COLUMNS = ('Price', 'Review Ratings', 'Global Ratings')
+
+
+def fingerprint(values):
+
+    """This function hashes a sequence of field values
+
+    Args:
+        values (iterable): The values to hash, in a fixed order
+
+    Returns:
+        str: The hex SHA-1 hash of the values
+    """
+
+    return hashlib.sha1(json.dumps(list(values)).encode()).hexdigest()
+
+
+def row_fingerprints(row: dict):
+
+    """This function computes both fingerprints of a scraped product
+
+    Args:
+        row (dict): The product information of a single product
+
+    Returns:
+        tuple: The fingerprint of the whole content and of the probe fields
+    """
+
+    return (fingerprint(row[column] for column in CONTENT_COLUMNS),
+            fingerprint(row[column] for column in PROBE_COLUMNS))
+
+
+class FingerprintStore():
+
+    """This class keeps the fingerprints of every product of a product list
+    in a SQLite file in the raw_data directory. On a later visit the cheap
+    probe of a product is compared with its stored probe fingerprint and the
+    product is only scraped in full, and written again, if it changed.
+
+    Attributes:
+
+        table (str): The RDS table the products belong to e.g., best_seller
+        path (str): The SQLite file storing the fingerprints
+
+    """
+
+    def __init__(self, table: str, path: str = 'fingerprints.sqlite'):
+
+        """
+        See help(FingerprintStore) for details
+        """
+
+        self.table = table
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS fingerprints (
+                           category TEXT NOT NULL,
+                           product_id TEXT NOT NULL,
+                           content TEXT NOT NULL,
+                           probe TEXT NOT NULL,
+                           updated REAL NOT NULL,
+                           PRIMARY KEY (category, product_id))''')
+
+
+    def get(self, product_id: str):
+
+        """This method returns the stored fingerprints of a product
+
+        Args:
+            product_id (str): The unique product ID
+
+        Returns:
+            tuple: The content and probe fingerprints or None if the product
+            has no fingerprints yet
+        """
+
+        return self.db.execute(
+            '''SELECT content, probe FROM fingerprints
+               WHERE category = ? AND product_id = ?''',
+            (self.table, product_id)).fetchone()
+
+
+    def put(self, product_id: str, content: str, probe: str):
+
+        """This method stores the fingerprints of a product
+
+        Args:
+            product_id (str): The unique product ID
+            content (str): Fingerprint of the whole content
+            probe (str): Fingerprint of the probe fields
+        """
+
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)',
+                (self.table, product_id, content, probe, time.time()))
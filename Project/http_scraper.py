@@ -0,0 +1,210 @@
+# Import all necessary packages
+
+import re
+import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+
+from field_selectors import FIELD_DEFAULTS, FIELD_ORDER
+from field_selectors import apply_transform, missing_required
+from metrics import instrument, inc
+from page_cache import shared_cache
+from selector_registry import shared_registry
+
+
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+class AmazonUKHttpScraper():
+
+    """This class reads Amazon UK product pages over plain HTTP without
+    launching a browser. The server-rendered html is parsed with lxml using
+    the same XPATH chains as AmazonUKScraper.retrieve_details_from_a_page so
+    both engines return the same tuple of product attributes.
+
+    Attributes:
+
+        session (requests.Session): Session whose connection pool is reused
+        for every request
+        timeout (float): Seconds to wait for a response before giving up
+
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 10):
+
+        """
+        See help(AmazonUKHttpScraper) for details
+        """
+
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Keep-alive connections are shared between threads up to pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Language': 'en-GB,en;q=0.9',
+            })
+        # Show prices in pounds as the Selenium scraper does after the
+        # region has been changed
+        self.session.cookies.set('i18n-prefs', 'GBP', domain='.amazon.co.uk')
+
+
+    def fetch(self, url):
+
+        """This method downloads the html of a webpage
+
+        Args:
+            url (str): The url of the webpage
+
+        Returns:
+            str: The html of the page or None if it could not be downloaded
+        """
+
+        status, page_html = self.fetch_response(url)
+        return page_html if status == 200 else None
+
+
+    def fetch_response(self, url):
+
+        """This method downloads a webpage and also returns the status code,
+        e.g., to slow down when Amazon answers with 503
+
+        Args:
+            url (str): The url of the webpage
+
+        Returns:
+            tuple: The status code (0 if there was no response) and the html
+            of the page (None if there was no response)
+        """
+
+        # Pages fetched recently by any engine are read from disk
+        cache = shared_cache()
+        if cache is not None:
+            page_html = cache.get(url)
+            if page_html is not None:
+                return 200, page_html
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as error:
+            inc('scraper_http_failures_total', reason=type(error).__name__)
+            return 0, None
+        if response.status_code != 200:
+            inc('scraper_http_failures_total', reason=str(response.status_code))
+        else:
+            inc('scraper_page_bytes_total', len(response.content), engine='http')
+            if cache is not None:
+                cache.put(url, response.text)
+        return response.status_code, response.text
+
+
+    @staticmethod
+    def parse(page_html, fields=FIELD_ORDER):
+
+        """This method runs the XPATH chain of every field against the html
+        of a product page
+
+        Args:
+            page_html (str): The html of a product page
+            fields (tuple): The fields to read, by default every field
+
+        Returns:
+            dict: The value of every field keyed by field name
+        """
+
+        tree = lxml_html.fromstring(page_html)
+        selectors = shared_registry()
+        details = {}
+        for field in fields:
+            details[field] = FIELD_DEFAULTS[field]
+            matched = None
+            for selector in selectors.chain(field):
+                found = tree.xpath(selector.xpath)
+                if not found:
+                    continue
+                if selector.attribute is None:
+                    value = _element_text(found[0])
+                else:
+                    value = found[0].get(selector.attribute)
+                try:
+                    details[field] = apply_transform(selector, value)
+                except IndexError:
+                    continue
+                matched = selector
+                break
+            selectors.record(field, matched)
+
+        return details
+
+
+    @instrument
+    def retrieve_details(self, url):
+
+        """This method downloads and parses a product page
+
+        Args:
+            url (str): The url of the product
+
+        Returns:
+            tuple: The same tuple as retrieve_details_from_a_page or None if
+            the page could not be downloaded or a required field is missing
+            and hence the page has to be read with Selenium instead
+        """
+
+        page_html = self.fetch(url)
+        if page_html is None:
+            return None
+
+        details = self.parse(page_html)
+        if missing_required(details):
+            return None
+
+        return tuple(details[field] for field in FIELD_ORDER)
+
+
+    def probe(self, url, fields):
+
+        """This method downloads a product page and reads only a few fields,
+        e.g., to check whether the price changed
+
+        Args:
+            url (str): The url of the product
+            fields (tuple): The fields to read
+
+        Returns:
+            tuple: The values of the fields or None if the page could not be
+            downloaded
+        """
+
+        page_html = self.fetch(url)
+        if page_html is None:
+            return None
+        details = self.parse(page_html, fields)
+        return tuple(details[field] for field in fields)
+
+
+def _element_text(element):
+
+    """This function mimics the visible text Selenium returns for an element.
+    Prices contain a hidden 'a-offscreen' copy which is preferred as it has
+    the formatted price, otherwise the whitespace of the text is collapsed
+    line by line.
+
+    Args:
+        element (lxml.html.HtmlElement): The element found by an XPATH
+
+    Returns:
+        str: The text of the element
+    """
+
+    offscreen = element.xpath('.//span[@class="a-offscreen"]')
+    if offscreen:
+        return offscreen[0].text_content().strip()
+
+    lines = [re.sub(r'\s+', ' ', line).strip()
+             for line in element.text_content().split('\n')]
+    return '\n'.join(line for line in lines if line)
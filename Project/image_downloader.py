@@ -0,0 +1,137 @@
+# Import all necessary packages
+
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import inc
+
+
+class ImageDownloader():
+
+    """This class downloads product images concurrently with a bounded pool of
+    threads sharing one keep-alive session. Every image is named after the
+    unique product ID it belongs to (or a hash of its link when there is no
+    ID) so images can be tied back to their product, and images which were
+    already downloaded on earlier runs are skipped.
+
+    Attributes:
+
+        directory (str): The directory the images are saved in
+        workers (int): Maximum number of images downloaded at the same time
+        timeout (float): Seconds to wait for a response before giving up
+        bytes_downloaded (int): Number of bytes written by this downloader
+
+    """
+
+    def __init__(self, directory: str, workers: int = 8, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 10):
+
+        """
+        See help(ImageDownloader) for details
+
+        Args:
+            retries (int): How many times a failed request is retried
+            backoff (float): Backoff factor between retries, the n-th retry
+            waits backoff * 2 ** (n - 1) seconds
+        """
+
+        self.directory = directory
+        self.workers = workers
+        self.timeout = timeout
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+        retry = Retry(total=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+    @staticmethod
+    def file_name(product_id, img_link):
+
+        """This method returns the content-addressed name of an image
+
+        Args:
+            product_id (str): The unique product ID of the image
+            img_link (str): The url of the image
+
+        Returns:
+            str: <product id>.jpg or <sha1 of the link>.jpg if the product ID
+            is empty
+        """
+
+        name = re.sub(r'[^A-Za-z0-9_-]', '', str(product_id or ''))
+        if not name:
+            name = hashlib.sha1(img_link.encode()).hexdigest()
+        return name + '.jpg'
+
+
+    def download(self, product_id, img_link):
+
+        """This method downloads a single image unless it already exists. The
+        image is written to a temporary file first which is renamed once the
+        download is complete, hence an interrupted download is simply
+        retried on the next run.
+
+        Args:
+            product_id (str): The unique product ID of the image
+            img_link (str): The url of the image
+
+        Returns:
+            str: The path of the image or None if the download failed
+        """
+
+        path = os.path.join(self.directory, self.file_name(product_id, img_link))
+        if os.path.exists(path):
+            return path
+
+        partial = path + '.part'
+        try:
+            with self.session.get(img_link, timeout=self.timeout,
+                                  stream=True) as response:
+                response.raise_for_status()
+                size = 0
+                with open(partial, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(partial, path)
+        except (requests.RequestException, OSError) as error:
+            print(f'Could not download {img_link}: {error}')
+            inc('scraper_image_failures_total')
+            if os.path.exists(partial):
+                os.remove(partial)
+            return None
+
+        with self._lock:
+            self.bytes_downloaded += size
+        inc('scraper_image_bytes_total', size)
+        return path
+
+
+    def download_all(self, product_ids, img_links):
+
+        """This method downloads the images of many products concurrently
+
+        Args:
+            product_ids (list): The unique product ID of every image
+            img_links (list): The url of every image
+
+        Returns:
+            list: The path of every image (None where the download failed) in
+            the same order as the arguments
+        """
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(self.download, product_ids, img_links))
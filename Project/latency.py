@@ -0,0 +1,107 @@
+# Import all necessary packages
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from metrics import observe
+
+
+class LatencyBudget():
+
+    """This class keeps track of how much of a run is spent waiting for the
+    browser (pages loading, elements appearing) compared to the time spent
+    doing actual work. Every scraper owns one budget and the budgets of all
+    scrapers in a run can be combined into a single report.
+
+    Attributes:
+
+        started (float): perf_counter value when the budget was created
+        waits (dict): Seconds spent waiting keyed by the name of the step
+
+    """
+
+    def __init__(self):
+
+        """
+        See help(LatencyBudget) for details
+        """
+
+        self.started = time.perf_counter()
+        self.waits = defaultdict(float)
+
+
+    @contextmanager
+    def waiting(self, step: str):
+
+        """This context manager adds the time spent inside the with block to
+        the waiting time of a step
+
+        Args:
+            step (str): The name of the step e.g., product
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            waited = time.perf_counter() - start
+            self.waits[step] += waited
+            observe('scraper_wait_seconds', waited, step=step)
+
+
+    def elapsed(self):
+
+        """This method returns the time elapsed since the budget was created
+
+        Returns:
+            float: Seconds since the budget was created
+        """
+
+        return time.perf_counter() - self.started
+
+
+    @staticmethod
+    def combine(budgets):
+
+        """This method sums up the budgets of every scraper used in a run
+
+        Args:
+            budgets (list): The LatencyBudget of every scraper
+
+        Returns:
+            dict: Elapsed, waiting and working seconds of the run along with
+            the waiting seconds of every step
+        """
+
+        waits = defaultdict(float)
+        elapsed = 0.0
+        for budget in budgets:
+            elapsed += budget.elapsed()
+            for step, seconds in budget.waits.items():
+                waits[step] += seconds
+
+        waiting = sum(waits.values())
+        return {
+                'elapsed': elapsed,
+                'waiting': waiting,
+                'working': elapsed - waiting,
+                'waits': dict(waits)
+                }
+
+
+    @staticmethod
+    def print_report(report: dict):
+
+        """This method prints the report returned by combine
+
+        Args:
+            report (dict): The combined latency report of a run
+        """
+
+        share = report['waiting'] / report['elapsed'] if report['elapsed'] else 0
+        print(f"Time spent waiting: {report['waiting']:.1f}s ({share:.0%}), "
+              f"working: {report['working']:.1f}s")
+        for step, seconds in sorted(report['waits'].items(),
+                                    key=lambda item: -item[1]):
+            print(f"    {step}: {seconds:.1f}s")
@@ -1,7 +1,10 @@
-import time
-import json
-import urllib
+import asyncio
 import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 import pandas as pd
@@ -12,6 +15,28 @@ import boto3
 from sqlalchemy import create_engine 
 
 from scraper_module_1 import AmazonUKScraper
+from http_scraper import AmazonUKHttpScraper
+from latency import LatencyBudget
+from dedup import DedupIndex, DatabaseDedup
+from image_downloader import ImageDownloader
+from s3_sync import S3Sync
+from rds_loader import BulkLoader
+from sinks import JsonLinesSink, ImageSink, BatchSink
+from checkpoint import CheckpointJournal
+from driver_pool import shared_pool
+from categories import ListingCrawler
+from async_engine import collector_from_env
+from work_queue import WorkQueue, new_run_id, worker_name
+from columnar import ParquetDatasetWriter
+from product_record import ProductRecord, ProductBatch
+import metrics
+from metrics import instrument, inc
+from selector_registry import shared_registry
+from page_cache import shared_cache
+from field_selectors import FIELD_ORDER, missing_required
+from fingerprint import FingerprintStore, PROBE_FIELDS, fingerprint, row_fingerprints
+from run_planner import RunPlanner, parse_plan
+from product_ids import canonical_urls, product_ids
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,6 +53,11 @@ class Run_Scraper():
         options (str): Category of products  i.e., Best Seller/Most Wished For
         items (str): Which type of product e.g., "Computer & Accessories"
         headless (bool): Headless mode being on or off whilst running scraper
+        workers (int): Number of Chrome instances used to visit product pages
+        in parallel, read from the workers environment variable
+        fetch_engine (str): 'selenium' to read every product page in Chrome
+        or 'http' to download and parse them without a browser, falling back
+        to Selenium when a required field is missing
 
     """
     
@@ -40,14 +70,110 @@ class Run_Scraper():
         self.options = options
         self.items = items
         self.headless = headless
+        self.workers = int(os.getenv('workers', 1))
+        self.fetch_engine = os.getenv('fetch_engine', 'selenium').lower()
+        if self.fetch_engine == 'http':
+            self.http_workers = int(os.getenv('http_workers', 8))
+            self.http_scraper = AmazonUKHttpScraper(pool_size=self.http_workers)
+        else:
+            self.http_scraper = None
 
-        self.scraper = AmazonUKScraper(options, items, "https://www.amazon.co.uk/", headless)
+        # Warm browser sessions are shared by every Run_Scraper of the process
+        # and, with a profile directory, kept set up between runs
+        profile_root = os.getenv('chrome_profile_dir')
+        if profile_root:
+            profile_root = os.path.abspath(profile_root)
+        self.pool = shared_pool(headless, self._new_scraper, profile_root)
+        # Latency budgets of every scraper used during the run
+        self.latency_budgets = []
+
+        self.scraper = self._acquire_scraper()
         self.driver = self.scraper.driver
-        time.sleep(1)
+        # creates a raw_data directory to save all the data
+        if os.path.basename(os.getcwd()) != 'raw_data':
+            AmazonUKScraper._create_raw_data_dir('raw_data')
+        # Compare both extraction engines on every product page if requested
+        self.benchmark_extraction = str(os.getenv('benchmark_extraction')).lower() == 'yes'
+        self.extraction_benchmarks = []
+        # Bytes transferred for every product page visited with Chrome
+        self.page_bytes = []
+        # Typed columnar copy of the products in raw_data/products
+        self.parquet_writer = None
+        self.parquet_files = []
+        if str(os.getenv('parquet_output')).lower() == 'yes':
+            self.parquet_writer = ParquetDatasetWriter(
+                os.path.join(os.getcwd(), 'products'))
+        # Prometheus scrapes the metrics of the run from this port
+        if os.getenv('metrics_port'):
+            metrics.serve(int(os.getenv('metrics_port')))
+        # Already scraped products are probed for changes instead of skipped
+        self.incremental = str(os.getenv('incremental')).lower() == 'yes'
+        self.known_ids = set()
+        self.updated_ids = set()
+        self.fingerprints = None
+        # Fingerprints are only stored once their product has been written
+        self.pending_fingerprints = {}
+        # Changed products read in full on the page opened by the probe
+        self.probed_rows = {}
+        # The RDS connection is opened once and shared by every product list
+        self.engine = None
 
     
 
-    
+    def _new_scraper(self, profile_dir):
+
+        """This function starts a new browser session for the driver pool
+
+        Args:
+            profile_dir (str, None): Persistent Chrome profile of the session
+
+        Returns:
+            AmazonUKScraper: A scraper with cookies accepted and region set
+        """
+
+        return AmazonUKScraper(self.options, self.items, 
+                               "https://www.amazon.co.uk/", self.headless, 
+                               create_dir=False, profile_dir=profile_dir)
+
+
+    def _acquire_scraper(self):
+
+        """This function takes a warm session from the driver pool and points
+        it at the product list of this Run_Scraper
+
+        Returns:
+            AmazonUKScraper: A scraper nobody else is using
+        """
+
+        scraper = self.pool.acquire()
+        scraper.options = self.options.lower()
+        scraper.items = self.items.lower()
+        # A new session keeps the time spent accepting the cookies and
+        # setting the region, a warm one from the pool starts a new budget
+        if scraper.setup_reported:
+            scraper.latency = LatencyBudget()
+        scraper.setup_reported = True
+        self.latency_budgets.append(scraper.latency)
+        return scraper
+
+
+    def switch_list(self, options: str, items: str):
+
+        """This function points the Run_Scraper and its browser session at
+        another product list or category, keeping Chrome, the RDS connection
+        and the settings of the run
+
+        Args:
+            options (str): Category of products  i.e., Best Seller/Most Wished For
+            items (str): Which type of product e.g., "Computer & Accessories"
+        """
+
+        self.options = options
+        self.items = items
+        self.scraper.options = options.lower()
+        self.scraper.items = items.lower()
+
+
     @validate_arguments
     def collectdata(self, n: Union[int, str]):
     
@@ -64,7 +190,25 @@ class Run_Scraper():
     
         """
         
-        prop_dict = {
+        prop_dict = self._empty_prop_dict()
+
+        for row in self.iter_products(n):
+            for key, value in row.items():
+                prop_dict[key].append(value)
+
+        return prop_dict
+
+
+    @staticmethod
+    def _empty_prop_dict():
+
+        """This function creates the product dictionary without products
+
+        Returns:
+            dict: An empty list for every column
+        """
+
+        return {
     
                     'UUID': [],
                     'Unique Product ID': [],
@@ -82,97 +226,735 @@ class Run_Scraper():
                     'Image link': [],
                     'Page Link': []
                     }
+
+
+    @validate_arguments
+    def collect_records(self, n: Union[int, str]):
+
+        """This function scrapes the products like collectdata but returns
+        them typed: prices, savings, ratings and numbers of ratings as 
+        numbers and missing values instead of placeholder text (see 
+        help(ProductRecord)). ProductBatch.to_frame() gives a DataFrame for
+        analysis.
+
+        Args:
+            n (int): How many products to scrape and gather information 
+
+        Returns:
+            ProductBatch: All products, column by column
+        """
+
+        batch = ProductBatch()
+        for row in self.iter_products(n):
+            batch.append(ProductRecord.from_row(row))
+        return batch
+
+
+    @validate_arguments
+    def iter_products(self, n: Union[int, str]):
+
+        """This generator scrapes the products one at a time and yields every
+        product as soon as it has been scraped, in the order of the links. 
+        Only a bounded number of products are held in memory at any time, 
+        however large n is. Every product is written to a checkpoint journal
+        first, hence a run which was interrupted carries on where it stopped
+        (see help(CheckpointJournal)).
+
+        Args:
+            n (int): How many products to scrape and gather information 
+
+        Yields:
+            dict: The product information of a single product
+        """
+
+        self._open_journal()
+        to_scrape = self._links_to_scrape(n)
+
+        # Products scraped by an interrupted run are not scraped again
+        yield from self.journal.resumed(to_scrape)
+        remaining = [link for link in to_scrape 
+                     if link not in self.journal.completed]
+
+        self.fingerprints = FingerprintStore(self._table_name())
+        if self.incremental:
+            remaining = self._changed_links(remaining)
+
+        for row in self._iter_rows(remaining):
+            if self._keep_row(row):
+                yield row
+
+        self._report_run()
+
+
+    def _iter_rows(self, links):
+
+        """This generator scrapes the product links with the fetch engine 
+        and number of workers of the run
+
+        Args:
+            links (list): The product links to scrape
+
+        Yields:
+            dict: The product information of every link, in the same order as
+            the links argument
+        """
+
+        if self.http_scraper is not None:
+            yield from self._iter_http(links)
+        elif self.workers > 1:
+            yield from self._iter_parallel(links)
+        else:
+            # We use tqdm to have a progress bar to ensure the scraper is working
+            for link in tqdm(links):
+                yield self._scrape_link(self.scraper, link)
+
+
+    @validate_arguments
+    def run_async(self, n: Union[int, str]):
+
+        """This function scrapes the products with the asyncio engine (see 
+        help(AsyncCollector)): the listing pages, product pages and images 
+        are fetched as concurrent tasks, rate limited per host and slowed 
+        down when Amazon pushes back. The products are then saved like 
+        dump_json_image_upload does, with the RDS and S3 uploads running 
+        at the same time.
+
+        Args:
+            n (int): How many products to scrape and gather information 
+
+        Returns:
+            DataFrame: All product information which was scraped
+        """
+
+        return asyncio.run(self._run_async(n))
+
+
+    async def _run_async(self, n):
+
+        """This coroutine does the work of run_async inside the event loop"""
+
+        self._open_journal()
+        loop = asyncio.get_running_loop()
+        raw_dir = os.getcwd()
+        image_dir = os.path.join(raw_dir, 'images_'+self.options)
+        os.makedirs(image_dir, exist_ok=True)
+        downloader = ImageDownloader(image_dir, 
+                                     workers=int(os.getenv('image_workers', 8)))
+
+        async with collector_from_env(self) as collector:
+            links = None
+            if self.journal.links is None and \
+                    os.getenv('link_discovery', 'selenium').lower() == 'http':
+                links = await collector.crawl(
+                    self.scraper.registry.list_url(self.options, self.items),
+                    max_pages=int(os.getenv('max_pages') or 0) or None)
+            to_scrape = self._links_to_scrape(n, links)
+
+            # Products scraped by an interrupted run are not scraped again
+            resumed = list(self.journal.resumed(to_scrape))
+            remaining = [link for link in to_scrape 
+                         if link not in self.journal.completed]
+            self.fingerprints = FingerprintStore(self._table_name())
+            if self.incremental:
+                remaining = self._changed_links(remaining)
+
+            resumed_images = loop.run_in_executor(
+                None, downloader.download_all, 
+                [row['Unique Product ID'] for row in resumed],
+                [row['Image link'] for row in resumed])
+            rows = await collector.collect(remaining, downloader, self._keep_row)
+            await resumed_images
+        self._report_run()
+
+        df_prod = pd.DataFrame(resumed + rows)
+        df_prod.to_json('data.json')
+        self._write_parquet(df_prod)
+
+        try:
+            update = os.getenv('update_cloud').lower()
+        except:
+            update = input('Update data in cloud? ').lower()
+
+        if update == 'yes':
+            await asyncio.gather(
+                loop.run_in_executor(None, self._upload_dataframe_rds, df_prod),
+                loop.run_in_executor(None, self._sync_to_s3, raw_dir, 
+                                     ['data.json'] + self.parquet_files))
+
+        # Everything is saved, hence the next run starts from scratch
+        self.journal.finish()
+        return df_prod
+
+
+    @validate_arguments
+    def coordinate(self, n: Union[int, str]):
+
+        """This function runs the coordinator of a distributed scrape. The 
+        links of the product list which were not scraped yet are pushed into
+        the work queue in PostgreSQL (see help(WorkQueue)), worker 
+        containers started with role='worker' scrape them and the 
+        coordinator collects their results once every link is done or 
+        failed. Setting queue_run_id carries on with the links of an earlier
+        coordinator run.
+
+        Args:
+            n (int): How many products to scrape and gather information 
+
+        Returns:
+            dict: All product information in the form of a dictionary, as 
+            returned by collectdata
+        """
+
+        self._open_journal()
+        to_scrape = self._links_to_scrape(n)
+        self.fingerprints = FingerprintStore(self._table_name())
+        if self.incremental:
+            to_scrape = self._changed_links(to_scrape)
+
+        work_queue = self._work_queue()
+        run_id = os.getenv('queue_run_id') or new_run_id(self._table_name())
+        added = work_queue.enqueue(run_id, [link for link in to_scrape 
+                                            if link not in self.journal.completed])
+        print(f'Queued {added} links as run {run_id}')
+
+        poll = float(os.getenv('queue_poll_seconds', 10))
+        progress = tqdm(total=len(to_scrape))
+        while True:
+            counts = work_queue.progress(run_id)
+            finished = counts.get('done', 0) + counts.get('failed', 0)
+            progress.update(finished + len(self.journal.completed) - progress.n)
+            if counts.get('pending', 0) + counts.get('leased', 0) == 0:
+                break
+            time.sleep(poll)
+        progress.close()
+        if counts.get('failed'):
+            print(f'{counts["failed"]} links failed on every attempt')
+
+        prop_dict = self._empty_prop_dict()
+        rows = list(self.journal.resumed()) + work_queue.results(run_id)
+        for row in rows:
+            if row['Page Link'] not in self.journal.completed and \
+                    not self._keep_row(row):
+                continue
+            for key, value in row.items():
+                prop_dict[key].append(value)
+        return prop_dict
+
+
+    def work(self):
+
+        """This function runs a worker of a distributed scrape. It leases 
+        links from the work queue, scrapes them with its warm Chrome session
+        and writes the products back until the queue has been empty for 
+        worker_idle_seconds.
+        """
+
+        work_queue = self._work_queue()
+        worker_id = worker_name()
+        idle_limit = float(os.getenv('worker_idle_seconds', 120))
+        poll = float(os.getenv('queue_poll_seconds', 10))
+        idle_since = time.monotonic()
+        scraped = 0
+
+        while time.monotonic() - idle_since < idle_limit:
+            leased = work_queue.lease(worker_id)
+            if not leased:
+                time.sleep(poll)
+                continue
+            for item_id, link in leased:
+                try:
+                    with work_queue.renewing(item_id, worker_id):
+                        row = self._scrape_link(self.scraper, link)
+                except Exception as error:
+                    print(f'Could not scrape {link}: {error!r}')
+                    work_queue.fail(item_id, worker_id, repr(error))
+                    continue
+                if work_queue.complete(item_id, worker_id, row):
+                    scraped += 1
+                else:
+                    print(f'Lease of {link} expired, another worker took it over')
+            idle_since = time.monotonic()
+
+        print(f'Worker {worker_id} scraped {scraped} products, queue is empty')
+        self._report_run()
+
+
+    def _work_queue(self):
+
+        """This function connects to the work queue shared by the 
+        coordinator and the workers
+
+        Returns:
+            WorkQueue: The queue, with its table created if needed
+        """
+
+        work_queue = WorkQueue(
+            self._engine_func(),
+            visibility_timeout=float(os.getenv('lease_seconds', 300)),
+            max_attempts=int(os.getenv('max_attempts', 3)))
+        work_queue.ensure_table()
+        return work_queue
+
+
+    def _open_journal(self):
+
+        """This function opens the checkpoint journal of the product list"""
+
+        self.journal = CheckpointJournal(
+            os.path.join(os.getcwd(), 'checkpoint_' + self._table_name() + '.jsonl'),
+            max_age_hours=float(os.getenv('checkpoint_max_age_hours', 12)))
+
+
+    def _keep_row(self, row):
+
+        """This function decides whether a scraped product is kept and, if
+        so, writes it to the checkpoint journal
+
+        Args:
+            row (dict): The product information of a single product
+
+        Returns:
+            bool: True if the product should be written
+        """
+
+        if not self._record_fingerprint(row):
+            inc('scraper_skipped_total', reason='content_unchanged')
+            return False
+        self.journal.record(row)
+        inc('scraper_products_total')
+        return True
+
+
+    def _report_run(self):
+
+        """This function prints where the time of the run went and saves
+        the selector statistics and the metrics"""
+
+        LatencyBudget.print_report(LatencyBudget.combine(self.latency_budgets))
+        if self.page_bytes:
+            print(f'Transferred {sum(self.page_bytes) / len(self.page_bytes) / 1024:.0f} KB '
+                  f'per product page over {len(self.page_bytes)} pages')
+        if self.extraction_benchmarks:
+            self._print_extraction_benchmark()
+        if shared_cache() is not None:
+            shared_cache().print_report()
+        shared_registry().save()
+        if metrics.ENABLED:
+            metrics.METRICS.write_json('metrics_' + self._table_name() + '.json')
+
+
+    @instrument
+    def _links_to_scrape(self, n, links=None):
+
+        """This function gets the links of the product list, connects to the
+        RDS database and leaves out the products which were already scraped.
+
+        Args:
+            n (int, str): How many products to scrape or 'all'
+            links (list, None): The links of the product list if they were 
+            already collected, e.g., by the asyncio engine
+
+        Returns:
+            list: The links of the products to scrape
+        """
         
-        links = self.scraper._get_all_links()
+        if self.journal.links is not None:
+            print(f'Resuming from checkpoint with {len(self.journal.completed)} '
+                  'products already scraped')
+            links = self.journal.links
+        else:
+            if links is None:
+                links = self._discover_links()
+            # A product reached from several ref links is scraped once, from
+            # its short /dp/<ASIN> url
+            links = list(dict.fromkeys(canonical_urls(links)))
+        self.journal.start(links)
         if n == 'all':
             n = len(links)
-        # We use tqdm to have a progress bar to ensure the scraper is working
-        engine = self._engine_func()
-        global conn
-        conn = engine.connect()
-        if self.options == 'most wished for':
-            try:
-                query_wish = '''SELECT "Unique Product ID" FROM most_wished_for'''
-                prod_id_most_wished_for = pd.DataFrame(conn.execute(query_wish))
-            except:
-                print("No data present in pgadmin")
-                prod_id_most_wished_for = pd.DataFrame(prop_dict)
-
-        else:
-            try:
-                query_best = '''SELECT "Unique Product ID" FROM best_seller'''
-                prod_id_best_seller = pd.DataFrame(conn.execute(query_best))
-            except:
-                print("No data present in pgadmin")
-                prod_id_best_seller = pd.DataFrame(prop_dict)
+        engine = self._connect()
         try:  
             empty_existing_data = os.getenv('start_empty')
         except:
             empty_existing_data = input('Do you want to start from an empty dictionary: ').lower()
+        self.dedup = self._dedup_index(engine, bootstrap=empty_existing_data == 'no')
+
+        # We check whether records exist in the SQL database connected
+        # with AWS RDS for all the links at once
+        # This prevents rescraping if the product id is already 
+        # scraped and added to the dict
+        # The IDs of every link are read at once
+        link_ids = product_ids(links[0:n]).tolist()
+        if empty_existing_data == 'no':
+            already_scraped = self.dedup.seen(link_ids)
+        else:
+            already_scraped = set()
+        if self.incremental:
+            self.known_ids = already_scraped
             
-        for link in tqdm(links[0:n]):  
-            # We check whether record exists in the SQL database connected
-            # with AWS RDS
-            # This prevents rescraping if the product id is already 
-            # scraped and added to the dict
-            if self.options == 'most wished for' and empty_existing_data == 'no':
-                try:
-                    s = prod_id_most_wished_for['Unique Product ID'].str.contains(self.scraper._unique_id_gen(link)).sum() 
-                except:
-                    s = 0
-                # There should only be one unique link
-                if s == 1:
+        to_scrape = []
+        for link, link_id in zip(links[0:n], link_ids):
+            if empty_existing_data == 'no':
+                if link_id in already_scraped:
+                    if self.incremental:
+                        # Checked for changes with a cheap probe instead
+                        to_scrape.append(link)
+                        continue
                     print('Already scraped this product')
+                    inc('scraper_skipped_total', reason='already_scraped')
                     continue
-                elif s == 0:
+                else:
                     print('This record does not exist in the SQL data in AWS RDS & PgAdmin')
-                    pass
-            elif self.options == 'best seller' and empty_existing_data == 'no':
-                try:
-                    s = prod_id_best_seller['Unique Product ID'].str.contains(self.scraper._unique_id_gen(link)).sum()
-                except:
-                    s = 0
-                if s == 1: # There should only be one unique link
-                    print('Already scraped this product')
+
+            to_scrape.append(link)
+
+        return to_scrape
+
+
+    def _discover_links(self):
+
+        """This function collects the product links of the product list,
+        reading the listing pages over HTTP with link_discovery='http' or 
+        clicking through them with Chrome otherwise
+
+        Returns:
+            list: The links of the products in the order of the list
+        """
+
+        if os.getenv('link_discovery', 'selenium').lower() == 'http':
+            # Read the listing pages over HTTP instead of clicking through them
+            crawler = ListingCrawler(max_pages=int(os.getenv('max_pages') or 0) or None)
+            return crawler.crawl(self.scraper.registry.list_url(self.options, self.items))
+        return self.scraper._get_all_links()
+
+
+    def _connect(self):
+
+        """This function connects to the RDS database the first time it is 
+        needed and reuses the connection afterwards
+
+        Returns:
+            Engine: SQLAlchemy engine connected to the RDS database
+        """
+
+        global conn
+        if self.engine is None:
+            self.engine = self._engine_func()
+            conn = self.engine.connect()
+        return self.engine
+
+
+    def _changed_links(self, links):
+
+        """This function probes the price and ratings of the products which 
+        were already scraped and compares them with their stored fingerprint.
+        Only new products and products whose probe changed are scraped in 
+        full. With Chrome, a changed product is read in full on the page 
+        which was opened for the probe and kept in probed_rows, hence it is
+        not loaded a second time.
+
+        Args:
+            links (list): The links of the products to scrape
+
+        Returns:
+            list: The links which still need a full scrape, in order
+        """
+
+        known = [link for link in links 
+                 if AmazonUKScraper._unique_id_gen(link) in self.known_ids]
+        if not known:
+            return links
+
+        unchanged = set()
+        if self.http_scraper is not None:
+            with ThreadPoolExecutor(max_workers=self.http_workers) as pool:
+                probes = list(pool.map(
+                    lambda link: self.http_scraper.probe(link, PROBE_FIELDS), known))
+            unchanged.update(link for link, values in zip(known, probes)
+                             if self._probe_unchanged(link, values))
+        else:
+            for link in tqdm(known):
+                values = self.scraper.probe(link, PROBE_FIELDS)
+                if self._probe_unchanged(link, values):
+                    unchanged.add(link)
                     continue
+                try:
+                    self.probed_rows[link] = self._make_row(
+                        link, self.scraper.retrieve_details_from_a_page())
+                except Exception as error:
+                    # Scraped again like any other product
+                    print(f'Could not read {link} after probing it: {error!r}')
+        inc('scraper_skipped_total', len(unchanged), reason='probe_unchanged')
+        print(f'{len(unchanged)} of {len(known)} already scraped products '
+              'are unchanged')
 
-                elif s == 0:
-                    print('This record does not exist in the SQL data in AWS RDS & PgAdmin')
-                    pass
+        return [link for link in links if link not in unchanged]
+
+
+    def _probe_unchanged(self, link, values):
+
+        """This function compares the probe of a product with its stored
+        fingerprint
+
+        Args:
+            link (str): The url of the product
+            values (tuple, None): The probed values, None if the probe failed
+
+        Returns:
+            bool: True if the product does not need to be scraped again
+        """
+
+        stored = self.fingerprints.get(AmazonUKScraper._unique_id_gen(link))
+        return values is not None and stored is not None \
+            and fingerprint(values) == stored[1]
+
+
+    def _record_fingerprint(self, row):
+
+        """This function computes the fingerprints of a scraped product and 
+        decides whether it has to be written. An already scraped product is 
+        only written again, to the history table, if its content changed.
+        The fingerprints are stored by _upload_dataframe_rds once the product
+        has been written, hence a change which never reached RDS is detected
+        again on the next run.
+
+        Args:
+            row (dict): The product information of a single product
+
+        Returns:
+            bool: True if the product should be written
+        """
+
+        product_id = row['Unique Product ID']
+        content, probe = row_fingerprints(row)
+        stored = self.fingerprints.get(product_id)
+        if product_id in self.known_ids:
+            if stored is not None and stored[0] == content:
+                return False
+            self.updated_ids.add(product_id)
+        self.pending_fingerprints[product_id] = (content, probe)
+        return True
+
+
+    @instrument
+    def _scrape_link(self, scraper, link):
+
+        """This function visits a single product link with the given scraper
+        and gathers the product information in the column order of the
+        product dictionary.
+
+        Args:
+            scraper (AmazonUKScraper): The scraper whose driver visits the link
+            link (str): The url of the product
+
+        Returns:
+            dict: The product information of a single product
+        """
+
+        # Changed products were already read when they were probed
+        row = self.probed_rows.pop(link, None)
+        if row is not None:
+            return row
+
+        # A product page visited recently is parsed from the page cache
+        # unless a required field is missing from the cached html
+        cache = shared_cache()
+        if cache is not None:
+            page_html = cache.get(link)
+            if page_html is not None:
+                details = AmazonUKHttpScraper.parse(page_html)
+                if not missing_required(details):
+                    return self._make_row(
+                        link, tuple(details[field] for field in FIELD_ORDER))
+
+        scraper.driver.get(link)
+        scraper._wait_for_product_page()
+        self.page_bytes.append(scraper._page_bytes())
+        if self.benchmark_extraction:
+            self.extraction_benchmarks.append(scraper.benchmark_extraction())
+
+        row = self._make_row(link, scraper.retrieve_details_from_a_page())
+        if cache is not None:
+            cache.put(link, scraper.driver.page_source, rendered=True)
+        return row
+
+
+    @staticmethod
+    def _make_row(link, details):
+
+        """This function arranges the tuple returned by 
+        retrieve_details_from_a_page into the columns of the product 
+        dictionary.
+
+        Args:
+            link (str): The url of the product
+            details (tuple): The product attributes read from the page
+
+        Returns:
+            dict: The product information of a single product
+        """
+
+        title, price, brand, voucher, price_override, review_ratings, \
+        global_ratings, topics_review, review_helpful, src = details
+
+        return {
+                'UUID': AmazonUKScraper._v4_uuid(),
+                'Unique Product ID': AmazonUKScraper._unique_id_gen(link),
+
+                'Title': title,
+                'Price': price,
+                'Brand': brand,
+                'Savings/Promotion': price_override,
+                'Voucher': voucher,
+
+                'Review Ratings': review_ratings,
+                'Global Ratings': global_ratings,
+                'Topics in Reviews': topics_review,
+                'Most Helpful Review': review_helpful,
+                'Image link': src,
+                'Page Link': link
+                }
+
+
+    def _print_extraction_benchmark(self):
+
+        """This function prints the average round-trips and milliseconds per
+        page of both extraction engines over the products of the run
+        """
+
+        benchmarks = pd.DataFrame([
+            {'engine': engine, **result[engine]}
+            for result in self.extraction_benchmarks 
+            for engine in ('element', 'batch')])
+        print(benchmarks.groupby('engine').mean())
+        mismatches = sum(not result['same_values'] 
+                         for result in self.extraction_benchmarks)
+        print(f'Pages where the engines disagree: {mismatches}')
+
+
+    def _iter_parallel(self, links):
+
+        """This generator splits the product links across a pool of Chrome 
+        instances and scrapes them concurrently. The scraper created in 
+        __init__ is one of the workers and every other worker takes a warm 
+        session from the driver pool with cookies accepted and region set.
+        Workers take the next link as soon as they are free and at most two 
+        products per worker are scraped ahead of the one being yielded.
+
+        Args:
+            links (list): The product links to scrape
+
+        Yields:
+            dict: The product information of every link, in the same order as
+            the links argument
+        """
+
+        n_workers = min(self.workers, len(links))
+        if n_workers == 0:
+            return
+
+        pending = queue.Queue()
+        for item in enumerate(links):
+            pending.put(item)
+        # Bounds the number of products scraped but not yet yielded
+        slots = threading.Semaphore(2 * n_workers)
+        stop = threading.Event()
+        done = {}
+        ready = threading.Condition()
+        progress = tqdm(total=len(links))
+
+        def work(worker_id):
+            if worker_id == 0:
+                scraper = self.scraper
             else:
-                pass
-    
-            
-    
-            self.driver.get(link)
-            time.sleep(1)
-            self.scraper._scroll_bottom()
-            time.sleep(2)
-            
-    
-            prop_dict['Unique Product ID'].append(self.scraper._unique_id_gen(link))
-            
-            prop_dict['Page Link'].append(link)
-            prop_dict['UUID'].append(self.scraper._v4_uuid())
-    
-    
-            title, price, brand, voucher, price_override, review_ratings, \
-            global_ratings, topics_review, review_helpful, \
-            src = self.scraper.retrieve_details_from_a_page()
-    
-            prop_dict['Title'].append(title)
-            prop_dict['Price'].append(price)
-            prop_dict['Brand'].append(brand)
-            prop_dict['Voucher'].append(voucher)
-            prop_dict['Savings/Promotion'].append(price_override)
-            prop_dict['Review Ratings'].append(review_ratings)
-            prop_dict['Global Ratings'].append(global_ratings)
-            prop_dict['Topics in Reviews'].append(topics_review)
-            prop_dict['Most Helpful Review'].append(review_helpful)
-            prop_dict['Image link'].append(src)
+                scraper = self._acquire_scraper()
+            try:
+                while True:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    try:
+                        index, link = pending.get_nowait()
+                    except queue.Empty:
+                        slots.release()
+                        return
+                    try:
+                        result = self._scrape_link(scraper, link)
+                    except Exception as error:
+                        result = error
+                    with ready:
+                        done[index] = result
+                        ready.notify_all()
+                    progress.update(1)
+            finally:
+                if worker_id != 0:
+                    self.pool.release(scraper)
 
-    
-        return prop_dict
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            for worker_id in range(n_workers):
+                pool.submit(work, worker_id)
+
+            try:
+                for index in range(len(links)):
+                    with ready:
+                        ready.wait_for(lambda: index in done)
+                        result = done.pop(index)
+                    slots.release()
+                    if isinstance(result, Exception):
+                        raise result
+                    yield result
+            finally:
+                # Let the workers finish if the products are no longer needed
+                stop.set()
+                for _ in range(n_workers):
+                    slots.release()
+        progress.close()
+
+
+    def _iter_http(self, links):
+
+        """This generator downloads and parses the product pages over HTTP 
+        using a pool of threads sharing one keep-alive session. Pages where a
+        required field could not be found (e.g., rendered with javascript or 
+        a captcha page) are read again with the Selenium driver.
+
+        Args:
+            links (list): The product links to scrape
+
+        Yields:
+            dict: The product information of every link, in the same order as
+            the links argument
+        """
+
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.http_workers) as pool:
+            for link in tqdm(links):
+                in_flight.append((link, pool.submit(
+                    self.http_scraper.retrieve_details, link)))
+                # Keep at most two pages per thread downloaded ahead
+                if len(in_flight) >= 2 * self.http_workers:
+                    yield self._http_row(*in_flight.popleft())
+            while in_flight:
+                yield self._http_row(*in_flight.popleft())
+
+
+    def _http_row(self, link, future):
+
+        """This function turns the result of a HTTP fetch into a product row,
+        falling back to the Selenium driver when the page could not be read
+
+        Args:
+            link (str): The url of the product
+            future (Future): The pending result of retrieve_details
+
+        Returns:
+            dict: The product information of a single product
+        """
+
+        page_details = future.result()
+        if page_details is None:
+            print('Falling back to Selenium for this product')
+            return self._scrape_link(self.scraper, link)
+        return self._make_row(link, page_details)
 
     
     def _engine_func(self):
@@ -194,15 +976,16 @@ class Run_Scraper():
         return engine
     
     
+    @instrument
     @validate_arguments 
     def dump_json_image_upload(self, prod_diction:dict):
     
         """This function creates a new json file, stores the product dictionary
         obtained from the prod_dict function in json format. Furthermore, it 
         creates another directory  within the raw_data directory or folder to 
-        store all the image data. Lastly, using the urlib package, it retrieves
-        the product image link from the product dictionary and stores 
-        each image as jpg. 
+        store all the image data. Lastly, using a pool of download threads, it
+        retrieves the product image link from the product dictionary and 
+        stores each image as <unique product id>.jpg. 
     
         Args:
             prod_diction (dict): Information about every product
@@ -212,12 +995,10 @@ class Run_Scraper():
             on the AWS RDS
         """
         # dump the generated dictionary into a json file
-
-        with open('data.json', 'w') as f:
-            df_prod = pd.DataFrame(prod_diction) 
-            # First convert our dictionary of product information
-            # to a dataframe and then to json
-            json.dump(df_prod.to_json(), f)
+        df_prod = pd.DataFrame(prod_diction) 
+        df_prod.to_json('data.json')
+        # Every run is also appended to the Parquet dataset
+        self._write_parquet(df_prod)
     
         # we will add images to the folder which are new or not been scraped
     
@@ -227,12 +1008,12 @@ class Run_Scraper():
             print("Directory already exists")
     
         os.chdir('images_'+self.options)
-        list_files = os.listdir(os.getcwd()) # dir is your directory path
-        number_files = len(list_files) 
-        for img_link in prod_diction['Image link']:
-            # download the image
-            urllib.request.urlretrieve(img_link, "{}.jpg".format(number_files))
-            number_files += 1
+        # Images are named after their product ID and skipped if they were
+        # downloaded on an earlier run
+        downloader = ImageDownloader(os.getcwd(), 
+                                     workers=int(os.getenv('image_workers', 8)))
+        downloader.download_all(prod_diction['Unique Product ID'], 
+                                prod_diction['Image link'])
 
         try:
             update = os.getenv('update_cloud').lower()
@@ -243,18 +1024,122 @@ class Run_Scraper():
             self._upload_dataframe_rds(df_prod)
             self._upload_to_cloud()
 
+        # Everything is saved, hence the next run starts from scratch
+        self.journal.finish()
+
 
     
     
+    @validate_arguments
+    def run_streaming(self, n: Union[int, str]):
+
+        """This function scrapes the products one at a time and passes every
+        product on to the sinks as soon as it is scraped: a JSON lines file, 
+        the image downloader and, if the cloud is updated, batched uploads to
+        RDS and S3. Memory stays flat however large n is and the products 
+        scraped so far are kept if the run stops halfway.
+
+        Args:
+            n (int): How many products to scrape and gather information 
+        """
+
+        raw_dir = os.getcwd()
+        image_dir = os.path.join(raw_dir, 'images_'+self.options)
+        os.makedirs(image_dir, exist_ok=True)
+        data_file = 'data_' + self._table_name() + '.jsonl'
+        batch_size = int(os.getenv('stream_batch_size', 25))
+
+        try:
+            update = os.getenv('update_cloud').lower()
+        except:
+            update = input('Update data in cloud? ').lower()
+
+        downloader = ImageDownloader(image_dir, 
+                                     workers=int(os.getenv('image_workers', 8)))
+        image_sink = ImageSink(downloader, track=update == 'yes')
+        sinks = [JsonLinesSink(os.path.join(raw_dir, data_file)), image_sink]
+        if self.parquet_writer is not None:
+            sinks.append(BatchSink(self._write_parquet, batch_size))
+        if update == 'yes':
+            sinks.append(BatchSink(
+                lambda rows: self._upload_dataframe_rds(pd.DataFrame(rows)), 
+                batch_size))
+            synced_parquet = []
+
+            def sync_batch(rows):
+                # Only the images of the batch are uploaded, once their 
+                # downloads have finished, with the Parquet files written 
+                # since the previous batch
+                images = [os.path.basename(path) 
+                          for path in image_sink.results(rows) if path]
+                parquet = self.parquet_files[len(synced_parquet):]
+                self._sync_to_s3(raw_dir, parquet, images)
+                synced_parquet.extend(parquet)
+
+            sinks.append(BatchSink(sync_batch, batch_size))
+
+        try:
+            for record in self.iter_products(n):
+                for sink in sinks:
+                    sink.write(record)
+        finally:
+            # Closing flushes the products left in the buffers
+            for sink in sinks:
+                sink.close()
+
+        if update == 'yes':
+            # The JSON lines file grows with every product and is uploaded once
+            self._sync_to_s3(raw_dir, [data_file], [])
+
+        # Everything is saved, hence the next run starts from scratch
+        self.journal.finish()
+
+
     def _upload_to_cloud(self):
     
         """
         This class method uses boto3 to create a S3 bucket on AWS and upload 
         the raw_data folder which includes all the image files 
-        and the product information json file. 
+        and the product information json file. Files which are already in 
+        the bucket unchanged are skipped.
     
         """
 
+        self._move_to_parent_dir(1) # Go back directory to access data.json
+        self._sync_to_s3(os.getcwd(), ['data.json'] + self.parquet_files)
+
+
+    @instrument
+    def _write_parquet(self, rows):
+
+        """This function appends products to the Parquet dataset in the
+        raw_data folder, partitioned by date and product list, if 
+        parquet_output='yes'
+
+        Args:
+            rows (DataFrame, list): The product information
+        """
+
+        if self.parquet_writer is None:
+            return
+        name = self.parquet_writer.write(rows, self._table_name())
+        self.parquet_files.append(os.path.join('products', name))
+
+
+    @instrument
+    def _sync_to_s3(self, raw_dir, data_files, images=None):
+
+        """This function uploads the given data files of the raw_data folder
+        and the images of the product list to S3. Only new or changed files 
+        are uploaded, several at a time.
+
+        Args:
+            raw_dir (str): The path of the raw_data folder
+            data_files (list): Names of the data files in the raw_data folder
+            images (list, None): Names of the images to upload, by default 
+            every image of the product list
+        """
+
         key_id = os.getenv('key_id')
         secret_key = os.getenv('secret_key')
         bucket_name = os.getenv('bucket_name')
@@ -265,36 +1150,106 @@ class Run_Scraper():
                         aws_access_key_id=key_id, 
                         aws_secret_access_key=secret_key)
 
-        self._move_to_parent_dir(1) # Go back directory to access data.json
-
-        s3.upload_file('data.json', bucket_name, 
-                        'raw_data/data.json')
+        sync = S3Sync(s3, bucket_name, 
+                      workers=int(os.getenv('upload_workers', 8)),
+                      multipart_threshold=int(os.getenv('multipart_threshold_mb', 8)) * 1024 * 1024)
 
-
-        for i in os.listdir('images_'+self.options): 
-            # We list out all the image files and loop to upload the files 
-            # to S3 one by one
-            s3.upload_file('images_'+self.options+'/'+i, 
-                    bucket_name, 'raw_data/images_'+self.options+'/'+i)
+        # The Parquet dataset is nested in partitions, hence it is synced 
+        # under its own prefix, listed recursively
+        parquet = [os.path.relpath(name, 'products') for name in data_files 
+                   if name.startswith('products' + os.sep)]
+        uploaded = sync.sync(raw_dir, 'raw_data/', 
+                             names=[name for name in data_files 
+                                    if not name.startswith('products' + os.sep)])
+        if parquet:
+            uploaded += sync.sync(os.path.join(raw_dir, 'products'), 
+                                  'raw_data/products/', names=parquet)
+        uploaded += sync.sync(os.path.join(raw_dir, 'images_'+self.options), 
+                              'raw_data/images_'+self.options+'/', names=images)
+        print(f'Uploaded {uploaded} new or changed files to S3')
     
     
+    @instrument
     def _upload_dataframe_rds(self, df):
     
         """This function takes the dataframe which was entered as an argument, 
-        converts it to SQL format and then saves it in the RDS.
+        converts it to SQL format and then saves it in the RDS. With 
+        bulk_load='yes' the rows are streamed with COPY instead.
     
         Args:
             df (DataFrame): Pandas dataframe containing all product information
             which was scraped
     
         """
-        if self.options == 'most wished for':
-            df.to_sql("most_wished_for", conn, if_exists='append', 
-                        chunksize=60) 
-        # We have defined engine globally previously
+        written = list(df['Unique Product ID'])
+        updates = df['Unique Product ID'].isin(self.updated_ids)
+        if updates.any():
+            # Changed products which are already stored are kept over time 
+            # in a history table
+            df[updates].to_sql(self._table_name() + '_history', conn, 
+                               if_exists='append', chunksize=60)
+            df = df[~updates]
+
+        if str(os.getenv('bulk_load')).lower() == 'yes':
+            # COPY into a staging table, skipping products already stored
+            BulkLoader(self.engine).load(df, self._table_name())
         else:
-            df.to_sql("best_seller", conn, if_exists='append', 
+            # We have defined engine globally previously
+            df.to_sql(self._table_name(), conn, if_exists='append', 
                         chunksize=60)
+        self.dedup.add(df['Unique Product ID'])
+
+        # Only products which reached RDS are compared with on the next run
+        for product_id in written:
+            stored = self.pending_fingerprints.pop(product_id, None)
+            if stored is not None and self.fingerprints is not None:
+                self.fingerprints.put(product_id, *stored)
+
+
+    def _dedup_index(self, engine, bootstrap: bool):
+
+        """This function sets up how already scraped products are detected, 
+        depending on the dedup_mode environment variable. With 'local' the 
+        product IDs are kept in a local index which is filled from RDS only 
+        once, with 'database' the candidate IDs of the run are looked up in
+        PostgreSQL with a single indexed query.
+
+        Args:
+            engine (Engine): SQLAlchemy engine connected to the RDS database
+            bootstrap (bool): Whether an empty local index should be filled 
+            from RDS
+
+        Returns:
+            DedupIndex or DatabaseDedup: The index used for this run
+        """
+
+        if os.getenv('dedup_mode', 'local').lower() == 'database':
+            dedup = DatabaseDedup(self._table_name(), engine)
+            dedup.ensure_index()
+        else:
+            dedup = DedupIndex(self._table_name())
+            if bootstrap and len(dedup) == 0:
+                dedup.bootstrap(conn)
+
+        return dedup
+
+
+    def _table_name(self, options=None):
+
+        """This function returns the name of the RDS table for the product 
+        list being scraped
+
+        Args:
+            options (str, None): Another product list than the one being
+            scraped
+
+        Returns:
+            str: most_wished_for or best_seller
+        """
+
+        if (options or self.options) == 'most wished for':
+            return 'most_wished_for'
+        return 'best_seller'
     
     def _move_to_parent_dir(self, n):
     
@@ -316,6 +1271,20 @@ if __name__ == '__main__':
 
     choices = os.getenv('options')
     scraper = Run_Scraper(choices, "computer & accessories", headless=False)
-    prod_diction = scraper.collectdata(os.getenv('n'))
-    scraper.dump_json_image_upload(prod_diction)
-    scraper.driver.quit()
+    role = os.getenv('role', 'standalone').lower()
+    if role == 'worker':
+        scraper.work()
+    elif role == 'coordinator':
+        prod_diction = scraper.coordinate(os.getenv('n'))
+        scraper.dump_json_image_upload(prod_diction)
+    elif os.getenv('run_plan'):
+        # Several product lists and categories sharing one run
+        RunPlanner(scraper, parse_plan(os.getenv('run_plan'))).run_plan(os.getenv('n'))
+    elif os.getenv('pipeline', 'batch').lower() == 'stream':
+        scraper.run_streaming(os.getenv('n'))
+    elif os.getenv('pipeline', 'batch').lower() == 'async':
+        scraper.run_async(os.getenv('n'))
+    else:
+        prod_diction = scraper.collectdata(os.getenv('n'))
+        scraper.dump_json_image_upload(prod_diction)
+    scraper.pool.close()
@@ -0,0 +1,276 @@
+# Import all necessary packages
+
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Metrics are only recorded with metrics='yes', otherwise instrument leaves
+# the methods untouched and the counters return straight away
+ENABLED = str(os.getenv('metrics')).lower() == 'yes'
+
+# Upper bounds in seconds of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+           float('inf'))
+
+
+class MetricsRegistry():
+
+    """This class keeps the counters and latency histograms of a run. Every
+    metric is identified by its name and labels, e.g.,
+    scraper_call_seconds{method="retrieve_details_from_a_page"}, and can
+    be exported in the Prometheus text format or as JSON.
+
+    Attributes:
+
+        counters (dict): The value of every counter keyed by (name, labels)
+        histograms (dict): The bucket counts, sum and count of every
+        histogram keyed by (name, labels)
+
+    """
+
+    def __init__(self):
+
+        """
+        See help(MetricsRegistry) for details
+        """
+
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, name: str, value: float = 1, **labels):
+
+        """This method adds to a counter
+
+        Args:
+            name (str): The name of the counter e.g., scraper_failures_total
+            value (float): The amount to add
+            labels: The labels of the counter e.g., method='_get_all_links'
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def observe(self, name: str, seconds: float, **labels):
+
+        """This method records a latency in a histogram
+
+        Args:
+            name (str): The name of the histogram e.g., scraper_call_seconds
+            seconds (float): The latency
+            labels: The labels of the histogram e.g., step='product'
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+
+    def to_prometheus(self):
+
+        """This method renders every metric in the Prometheus text format
+
+        Returns:
+            str: The metrics, one sample per line
+        """
+
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(value, buckets=list(value['buckets']))
+                          for key, value in self.histograms.items()}
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} '
+                                 f'{cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+    def to_dict(self):
+
+        """This method returns every metric in a JSON friendly form
+
+        Returns:
+            dict: The counters and histograms, each a list of samples with
+            their labels
+        """
+
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels),
+                                'count': histogram['count'],
+                                'sum': round(histogram['sum'], 6),
+                                'buckets': dict(zip(map(str, BUCKETS),
+                                                    histogram['buckets']))}
+                               for (name, labels), histogram
+                               in sorted(self.histograms.items())],
+            }
+
+
+    def write_json(self, path: str):
+
+        """This method saves the metrics of the run in a JSON file
+
+        Args:
+            path (str): The file to write
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                                      .replace('"', '\\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
+
+
+# The registry shared by every module of the process
+METRICS = MetricsRegistry()
+
+_server = None
+
+
+def inc(name: str, value: float = 1, **labels):
+
+    """This function adds to a counter of the shared registry if metrics
+    are enabled (see help(MetricsRegistry.inc))"""
+
+    if ENABLED:
+        METRICS.inc(name, value, **labels)
+
+
+def observe(name: str, seconds: float, **labels):
+
+    """This function records a latency in the shared registry if metrics
+    are enabled (see help(MetricsRegistry.observe))"""
+
+    if ENABLED:
+        METRICS.observe(name, seconds, **labels)
+
+
+def selector_hit(field: str, index):
+
+    """This function counts which selector of the fallback chain of a field
+    (see field_selectors.py) found the value, hence it shows how often the
+    price or savings fall through to the later XPATHS
+
+    Args:
+        field (str): The name of the field e.g., price
+        index (int, None): The position of the selector in the chain or None
+        if the default value was used
+    """
+
+    if ENABLED:
+        METRICS.inc('scraper_selector_hits_total', field=field,
+                    selector='default' if index is None else str(index))
+
+
+def instrument(func):
+
+    """This decorator records the latency of every call of a method in the
+    scraper_call_seconds histogram and every exception raised in the
+    scraper_failures_total counter, labelled with the name of the method.
+    When metrics are disabled the method is returned unchanged.
+
+    Args:
+        func (callable): The method to instrument
+
+    Returns:
+        callable: The instrumented method
+    """
+
+    if not ENABLED:
+        return func
+
+    method = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            METRICS.inc('scraper_failures_total', method=method,
+                        error=type(error).__name__)
+            raise
+        finally:
+            METRICS.observe('scraper_call_seconds',
+                            time.perf_counter() - start, method=method)
+
+    return wrapper
+
+
+def serve(port: int):
+
+    """This function exposes the shared registry to Prometheus at
+    http://<host>:<port>/metrics from a background thread. It only starts
+    one server per process.
+
+    Args:
+        port (int): The port to listen on
+    """
+
+    global _server
+    if not ENABLED or _server is not None:
+        return
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = METRICS.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _server = ThreadingHTTPServer(('', port), MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
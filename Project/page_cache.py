@@ -0,0 +1,237 @@
+# Import all necessary packages
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from metrics import inc
+from product_ids import canonical_url
+
+
+_shared_cache = None
+_cache_lock = threading.Lock()
+
+# Query parameters which only track where a link was clicked and do not
+# change the page
+TRACKING_PARAMS = {'ref', 'ref_', 'psc', 'th', 'qid', 'sr', 'crid', 'sprefix',
+                   'keywords', 'smid', 'tag', 'linkCode', 'content-id',
+                   '_encoding', 'spLa', 'dib', 'dib_tag'}
+TRACKING_PREFIXES = ('pd_rd_', 'pf_rd_', 'utm_')
+
+# Robot check pages are served with status 200 and must never be cached
+UNCACHEABLE_MARKERS = ('/errors/validateCaptcha',
+                       'Type the characters you see in this image')
+
+
+def normalize_url(url: str):
+
+    """This function turns the url of a page into its cache key. The
+    /ref=... path segment and tracking parameters are dropped, the remaining
+    parameters sorted and product pages reduced to /dp/<ASIN>, hence the same
+    product reached from different lists shares one entry.
+
+    Args:
+        url (str): The url of the page
+
+    Returns:
+        str: The normalised url
+    """
+
+    parts = urlsplit(canonical_url(url))
+    path = re.sub(r'/ref=[^/]*', '', parts.path).rstrip('/') or '/'
+    query = sorted((key, value) for key, value in
+                   parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in TRACKING_PARAMS
+                   and not key.startswith(TRACKING_PREFIXES))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path,
+                       urlencode(query), ''))
+
+
+def page_kind(url: str):
+
+    """This function tells which TTL applies to a page
+
+    Args:
+        url (str): The url of the page
+
+    Returns:
+        str: 'product' for product pages, otherwise 'listing'
+    """
+
+    return 'product' if '/dp/' in urlsplit(url).path else 'listing'
+
+
+class PageCache():
+
+    """This class keeps the html of listing and product pages in a SQLite
+    file in the raw_data directory, compressed with zlib and keyed by the
+    normalised url (see help(normalize_url)). A rerun after a crash, a test
+    or another category of the same list reads pages fetched recently from
+    disk instead of Amazon. Entries expire after the TTL of their kind of
+    page and the least recently used pages are evicted once the cache
+    outgrows max_bytes.
+
+    Attributes:
+
+        path (str): The SQLite file storing the pages
+        ttls (dict): Seconds a page stays fresh keyed by kind of page
+        max_bytes (int): Maximum size of the compressed pages
+        stats (dict): Hits, misses and expired lookups keyed by kind of page
+        evictions (int): Pages evicted to stay below max_bytes
+
+    """
+
+    def __init__(self, path: str = 'page_cache.sqlite', ttls: dict = None,
+                 max_bytes: int = 512 * 1024 * 1024):
+
+        """
+        See help(PageCache) for details
+        """
+
+        self.path = os.path.abspath(path)
+        self.ttls = ttls or {'listing': 6 * 3600, 'product': 24 * 3600}
+        self.max_bytes = max_bytes
+        self.stats = {kind: {'hits': 0, 'misses': 0, 'expired': 0}
+                      for kind in self.ttls}
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS pages (
+                           key TEXT PRIMARY KEY,
+                           kind TEXT NOT NULL,
+                           fetched REAL NOT NULL,
+                           accessed REAL NOT NULL,
+                           size INTEGER NOT NULL,
+                           rendered INTEGER NOT NULL,
+                           body BLOB NOT NULL)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pages_accessed_idx '
+                        'ON pages (accessed)')
+        self.size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+
+    def get(self, url: str, rendered: bool = False):
+
+        """This method returns the cached html of a page if it is still
+        fresh
+
+        Args:
+            url (str): The url of the page
+            rendered (bool): Only return the page if it was stored from the
+            page source of Chrome, e.g., a listing page where every product
+            has been loaded
+
+        Returns:
+            str: The html of the page or None on a miss
+        """
+
+        kind = page_kind(url)
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self.db.execute(
+                'SELECT fetched, size, body, rendered FROM pages WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or (rendered and not row[3]):
+                result = 'misses'
+            elif now - row[0] > self.ttls[kind]:
+                with self.db:
+                    self.db.execute('DELETE FROM pages WHERE key = ?', (key,))
+                self.size -= row[1]
+                result = 'expired'
+            else:
+                with self.db:
+                    self.db.execute('UPDATE pages SET accessed = ? WHERE key = ?',
+                                    (now, key))
+                result = 'hits'
+            self.stats[kind][result] += 1
+        inc('scraper_page_cache_total', kind=kind, result=result)
+        if result != 'hits':
+            return None
+        return zlib.decompress(row[2]).decode('utf-8')
+
+
+    def put(self, url: str, page_html: str, rendered: bool = False):
+
+        """This method stores the html of a page, evicting the least
+        recently used pages if the cache grows above max_bytes
+
+        Args:
+            url (str): The url of the page
+            page_html (str): The html of the page
+            rendered (bool): Whether the html is the page source of Chrome
+        """
+
+        if not page_html or any(marker in page_html for marker in UNCACHEABLE_MARKERS):
+            return
+        body = zlib.compress(page_html.encode('utf-8'), 6)
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self.db:
+            old = self.db.execute('SELECT size FROM pages WHERE key = ?',
+                                  (key,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (key, page_kind(url), now, now, len(body), int(rendered), body))
+            self.size += len(body) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+
+
+    def _evict(self):
+
+        """This method deletes the least recently used pages until the cache
+        is back below max_bytes"""
+
+        excess = self.size - self.max_bytes
+        evicted = []
+        freed = 0
+        for key, size in self.db.execute(
+                'SELECT key, size FROM pages ORDER BY accessed').fetchall():
+            if freed >= excess:
+                break
+            evicted.append((key,))
+            freed += size
+        self.db.executemany('DELETE FROM pages WHERE key = ?', evicted)
+        self.size -= freed
+        self.evictions += len(evicted)
+
+
+    def print_report(self):
+
+        """This method prints the hit rate of every kind of page and the
+        size of the cache"""
+
+        for kind, stats in self.stats.items():
+            lookups = stats['hits'] + stats['misses'] + stats['expired']
+            if lookups == 0:
+                continue
+            print(f'Page cache {kind}: {stats["hits"]} hits, {stats["misses"]} '
+                  f'misses, {stats["expired"]} expired '
+                  f'({stats["hits"] / lookups:.0%} hit rate)')
+        print(f'Page cache size: {self.size / 1024 / 1024:.1f} MB, '
+              f'{self.evictions} pages evicted')
+
+
+def shared_cache():
+
+    """This function returns the page cache shared by every scraper of the
+    process, created from the page_cache and cache_* environment variables
+
+    Returns:
+        PageCache: The shared cache or None if page_cache is not 'yes'
+    """
+
+    global _shared_cache
+    if str(os.getenv('page_cache')).lower() != 'yes':
+        return None
+    with _cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PageCache(
+                ttls={'listing': float(os.getenv('cache_ttl_listing_hours', 6)) * 3600,
+                      'product': float(os.getenv('cache_ttl_product_hours', 24)) * 3600},
+                max_bytes=int(float(os.getenv('cache_max_mb', 512)) * 1024 * 1024))
+        return _shared_cache
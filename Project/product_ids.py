@@ -0,0 +1,220 @@
+# Import all necessary packages
+
+import argparse
+import hashlib
+import re
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+
+BASE_URL = 'https://www.amazon.co.uk'
+
+# The ASIN of a product in the path of its url, e.g., /Name/dp/B08N5WRWNW/ref=...
+PATH_ASIN = r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?=[/?#]|$)'
+# or in the query of links which do not point at /dp/, e.g., ?pd_rd_i=B08N5WRWNW
+QUERY_ASIN = r'[?&](?:pd_rd_i|asin|ASIN)=([A-Z0-9]{10})(?=[&#]|$)'
+ORIGIN = r'^(https?://[^/?#]+)'
+
+_PATH_ASIN = re.compile(PATH_ASIN)
+_QUERY_ASIN = re.compile(QUERY_ASIN)
+_ORIGIN = re.compile(ORIGIN)
+
+
+def extract_asin(url: str):
+
+    """This function reads the ASIN of a product from its url
+
+    Args:
+        url (str): The url of a product page
+
+    Returns:
+        str: The ASIN e.g., B08N5WRWNW or None if the url has none
+    """
+
+    found = _PATH_ASIN.search(url) or _QUERY_ASIN.search(url)
+    return found.group(1) if found else None
+
+
+def product_id(url: str):
+
+    """This function returns the unique product ID of a url: its ASIN or,
+    for the rare link without one, a hash of the url without its query,
+    hence the same link always gets the same ID
+
+    Args:
+        url (str): The url of a product page
+
+    Returns:
+        str: The ASIN or URL-<hash>
+    """
+
+    asin = extract_asin(url)
+    if asin is not None:
+        return asin
+    return _fallback_id(url)
+
+
+def _fallback_id(url):
+    path = re.sub(r'/ref=[^/?#]*', '', re.split(r'[?#]', url)[0])
+    return 'URL-' + hashlib.sha1(path.encode()).hexdigest()[:16]
+
+
+def canonical_url(url: str):
+
+    """This function shortens the url of a product to /dp/<ASIN>, which
+    Amazon serves without redirects or tracking parameters
+
+    Args:
+        url (str): The url of a product page
+
+    Returns:
+        str: e.g., https://www.amazon.co.uk/dp/B08N5WRWNW or the url itself
+        if it has no ASIN
+    """
+
+    asin = extract_asin(url)
+    if asin is None:
+        return url
+    origin = _ORIGIN.match(url)
+    return f'{origin.group(1) if origin else BASE_URL}/dp/{asin}'
+
+
+def extract_asins(urls):
+
+    """This function reads the ASINs of many urls at once with the
+    vectorised string methods of pandas
+
+    Args:
+        urls (Series, list): The urls of product pages
+
+    Returns:
+        Series: The ASIN of every url, NaN where there is none
+    """
+
+    urls = pd.Series(urls, dtype='object')
+    asins = urls.str.extract(PATH_ASIN, expand=False)
+    return asins.fillna(urls.str.extract(QUERY_ASIN, expand=False))
+
+
+def product_ids(urls):
+
+    """This function is the vectorised product_id
+
+    Args:
+        urls (Series, list): The urls of product pages
+
+    Returns:
+        Series: The unique product ID of every url
+    """
+
+    urls = pd.Series(urls, dtype='object')
+    ids = extract_asins(urls)
+    missing = ids.isna()
+    if missing.any():
+        ids[missing] = urls[missing].map(_fallback_id)
+    return ids
+
+
+def canonical_urls(urls):
+
+    """This function is the vectorised canonical_url
+
+    Args:
+        urls (Series, list): The urls of product pages
+
+    Returns:
+        Series: The canonical url of every url
+    """
+
+    urls = pd.Series(urls, dtype='object')
+    asins = extract_asins(urls)
+    origins = urls.str.extract(ORIGIN, expand=False).fillna(BASE_URL)
+    return (origins + '/dp/' + asins).fillna(urls)
+
+
+def backfill(engine, table: str, collapse: bool = True, dry_run: bool = False):
+
+    """This function recomputes the product IDs and page links of the rows
+    already stored in a RDS table. Rows whose ID was cut out of the url by
+    the old slicing are given their ASIN and, with collapse, only one row
+    of every product is kept. The tables have no column telling when a row
+    was stored and the UUIDs are random, hence which of the duplicated rows
+    survives is arbitrary: the one with the smallest UUID is kept, so a dry
+    run reports what the real run does.
+
+    Args:
+        engine (Engine): SQLAlchemy engine connected to the RDS database
+        table (str): The table e.g., best_seller
+        collapse (bool): Whether duplicated products are deleted, which is
+        not wanted for the history tables
+        dry_run (bool): Only count the rows which would change
+
+    Returns:
+        dict: The number of rows read, updated and removed
+    """
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(table):
+            return {'rows': 0, 'updated': 0, 'removed': 0}
+        df = pd.read_sql(text(f'SELECT "UUID", "Unique Product ID", "Page Link" '
+                              f'FROM {table} ORDER BY "UUID"'), conn)
+
+        ids = product_ids(df['Page Link'])
+        links = canonical_urls(df['Page Link'])
+        duplicate = ids.duplicated(keep='first') if collapse \
+            else pd.Series(False, index=df.index)
+        changed = ((ids != df['Unique Product ID']) | (links != df['Page Link'])) \
+            & ~duplicate
+        counts = {'rows': len(df), 'updated': int(changed.sum()),
+                  'removed': int(duplicate.sum())}
+        if dry_run or not (changed.any() or duplicate.any()):
+            return counts
+
+        staging = table + '_id_backfill'
+        pd.DataFrame({'UUID': df['UUID'], 'product_id': ids, 'page_link': links,
+                      'duplicate': duplicate})[changed | duplicate] \
+            .to_sql(staging, conn, if_exists='replace', index=False)
+        conn.execute(text(
+            f'DELETE FROM {table} WHERE "UUID" IN '
+            f'(SELECT "UUID" FROM {staging} WHERE duplicate)'))
+        conn.execute(text(
+            f'UPDATE {table} AS t SET "Unique Product ID" = s.product_id, '
+            f'"Page Link" = s.page_link FROM {staging} AS s '
+            f'WHERE t."UUID" = s."UUID" AND NOT s.duplicate'))
+        conn.execute(text(f'DROP TABLE {staging}'))
+    return counts
+
+
+if __name__ == '__main__':
+
+    import os
+    from dotenv import load_dotenv
+    from sqlalchemy import create_engine
+
+    from dedup import DedupIndex
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description='Give the products stored in RDS their ASIN as product ID '
+                    'and remove the duplicates created by the old IDs')
+    parser.add_argument('--tables', nargs='+',
+                        default=['best_seller', 'most_wished_for'])
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only count the rows which would change')
+    args = parser.parse_args()
+
+    engine = create_engine(f"postgresql+psycopg2://{os.getenv('user')}:"
+                           f"{os.getenv('password')}@{os.getenv('endpoint')}:5432/postgres")
+    for table in args.tables:
+        counts = backfill(engine, table, dry_run=args.dry_run)
+        print(f'{table}: {counts["updated"]} of {counts["rows"]} rows updated, '
+              f'{counts["removed"]} duplicates removed')
+        history = backfill(engine, table + '_history', collapse=False,
+                           dry_run=args.dry_run)
+        print(f'{table}_history: {history["updated"]} of {history["rows"]} rows updated')
+        if not args.dry_run and os.path.exists(os.path.join('raw_data', 'dedup_index.sqlite')):
+            # The local dedup index still holds the old IDs
+            index = DedupIndex(table, os.path.join('raw_data', 'dedup_index.sqlite'))
+            with engine.connect() as conn:
+                index.rebuild(conn)
@@ -0,0 +1,254 @@
+# Import all necessary packages
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Text the scraper stores when a field is not on the page (see FIELD_DEFAULTS
+# in field_selectors.py), read as a missing value
+SENTINELS = frozenset(['N/A', 'No rating', 'No global rating',
+                       'No review topics', 'No most helpful review'])
+
+
+def _text(value):
+    if value is None or value in SENTINELS:
+        return None
+    return value
+
+
+def parse_price(value):
+
+    """This function reads a price e.g., '£1,024.99' -> 1024.99
+
+    Args:
+        value (str): The price as scraped
+
+    Returns:
+        float: The price or None if there is no price
+    """
+
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', _text(value) or '')
+    return float(match.group().replace(',', '')) if match else None
+
+
+def parse_savings_percent(value):
+
+    """This function reads the saving of a promotion e.g., '-20%' or
+    '£5.00 (20%)' -> 20.0
+
+    Args:
+        value (str): The saving as scraped
+
+    Returns:
+        float: The saving in percent or None if there is no saving
+    """
+
+    match = re.search(r'(\d+(?:\.\d+)?)\s*%', _text(value) or '')
+    return float(match.group(1)) if match else None
+
+
+def parse_rating(value):
+
+    """This function reads a rating e.g., '4.5 out of 5' -> 4.5
+
+    Args:
+        value (str): The rating as scraped
+
+    Returns:
+        float: The rating or None if there is no rating
+    """
+
+    match = re.match(r'\s*(\d+(?:\.\d+)?)', _text(value) or '')
+    return float(match.group(1)) if match else None
+
+
+def parse_count(value):
+
+    """This function reads a number of ratings e.g.,
+    '12,345 global ratings' -> 12345
+
+    Args:
+        value (str): The number of ratings as scraped
+
+    Returns:
+        int: The number of ratings or None if there are none
+    """
+
+    match = re.match(r'\s*(\d[\d,]*)', _text(value) or '')
+    return int(match.group(1).replace(',', '')) if match else None
+
+
+@dataclass
+class ProductRecord():
+
+    """This class holds the information of a single product with the price,
+    saving, rating and number of ratings as numbers and None instead of the
+    placeholder text for anything which is not on the page. The values are
+    parsed once when the product is scraped.
+
+    Attributes:
+
+        uuid (str): The v4 UUID of the record
+        product_id (str): The unique product ID
+        title (str, None): The product title
+        price (float, None): The price in pounds
+        brand (str, None): The brand
+        savings_percent (float, None): The saving of a promotion in percent
+        voucher (str, None): The voucher text
+        rating (float, None): The average rating out of 5
+        rating_count (int, None): The number of global ratings
+        topics (str, None): The topics in reviews
+        helpful_review (str, None): The most helpful review
+        image_link (str): The link of the main image
+        page_link (str): The link of the product page
+
+    """
+
+    __slots__ = ('uuid', 'product_id', 'title', 'price', 'brand',
+                 'savings_percent', 'voucher', 'rating', 'rating_count',
+                 'topics', 'helpful_review', 'image_link', 'page_link')
+
+    uuid: str
+    product_id: str
+    title: Optional[str]
+    price: Optional[float]
+    brand: Optional[str]
+    savings_percent: Optional[float]
+    voucher: Optional[str]
+    rating: Optional[float]
+    rating_count: Optional[int]
+    topics: Optional[str]
+    helpful_review: Optional[str]
+    image_link: str
+    page_link: str
+
+
+    @classmethod
+    def from_row(cls, row: dict):
+
+        """This method parses a product of the product dictionary
+
+        Args:
+            row (dict): The product information of a single product as
+            returned by Run_Scraper.iter_products
+
+        Returns:
+            ProductRecord: The typed product
+        """
+
+        return cls(uuid=row['UUID'],
+                   product_id=row['Unique Product ID'],
+                   title=_text(row['Title']),
+                   price=parse_price(row['Price']),
+                   brand=_text(row['Brand']),
+                   savings_percent=parse_savings_percent(row['Savings/Promotion']),
+                   voucher=_text(row['Voucher']),
+                   rating=parse_rating(row['Review Ratings']),
+                   rating_count=parse_count(row['Global Ratings']),
+                   topics=_text(row['Topics in Reviews']),
+                   helpful_review=_text(row['Most Helpful Review']),
+                   image_link=row['Image link'],
+                   page_link=row['Page Link'])
+
+
+class ProductBatch():
+
+    """This class collects many products column by column. The numeric
+    columns are kept in NumPy arrays which grow as products are added, hence
+    the DataFrame is built from them directly without converting every cell
+    from a Python object.
+
+    Attributes:
+
+        capacity (int): Number of products the arrays can hold before they
+        grow
+
+    """
+
+    NUMERIC = {'price': np.float64, 'savings_percent': np.float64,
+               'rating': np.float64, 'rating_count': np.int64}
+    TEXT = ('uuid', 'product_id', 'title', 'brand', 'voucher', 'topics',
+            'helpful_review', 'image_link', 'page_link')
+
+    def __init__(self, capacity: int = 64):
+
+        """
+        See help(ProductBatch) for details
+        """
+
+        self.capacity = max(capacity, 1)
+        self._size = 0
+        self._values = {name: np.zeros(self.capacity, dtype)
+                        for name, dtype in self.NUMERIC.items()}
+        # True where the value is missing
+        self._missing = {name: np.zeros(self.capacity, bool)
+                         for name in self.NUMERIC}
+        self._text = {name: [] for name in self.TEXT}
+
+
+    def __len__(self):
+        return self._size
+
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.NUMERIC:
+            self._values[name] = np.resize(self._values[name], self.capacity)
+            self._missing[name] = np.resize(self._missing[name], self.capacity)
+
+
+    def append(self, record: ProductRecord):
+
+        """This method adds a product
+
+        Args:
+            record (ProductRecord): The product to add
+        """
+
+        if self._size == self.capacity:
+            self._grow()
+        for name in self.NUMERIC:
+            value = getattr(record, name)
+            self._missing[name][self._size] = value is None
+            self._values[name][self._size] = 0 if value is None else value
+        for name in self.TEXT:
+            self._text[name].append(getattr(record, name))
+        self._size += 1
+
+
+    def extend(self, records):
+
+        """This method adds many products
+
+        Args:
+            records (iterable): ProductRecords to add
+        """
+
+        for record in records:
+            self.append(record)
+
+
+    def to_frame(self):
+
+        """This method builds a DataFrame with nullable numeric columns
+
+        Returns:
+            DataFrame: One row per product
+        """
+
+        size = self._size
+        columns = {name: self._text[name] for name in self.TEXT}
+        for name in self.NUMERIC:
+            values = self._values[name][:size].copy()
+            missing = self._missing[name][:size].copy()
+            if self.NUMERIC[name] is np.int64:
+                columns[name] = pd.arrays.IntegerArray(values, missing)
+            else:
+                values[missing] = np.nan
+                columns[name] = values
+        return pd.DataFrame({name: columns[name]
+                             for name in ProductRecord.__slots__})
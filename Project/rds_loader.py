@@ -0,0 +1,144 @@
+# Import all necessary packages
+
+import csv
+import io
+import time
+
+from sqlalchemy import text
+
+
+class BulkLoader():
+
+    """This class loads scraped products into PostgreSQL with a single
+    COPY FROM STDIN into a temporary staging table, followed by one
+    INSERT ... SELECT which skips products already stored. This replaces
+    the many small multi-row INSERTs sent by DataFrame.to_sql, which are slow
+    against a remote RDS instance. Any PostgreSQL database works, hence a
+    local instance can be used for testing.
+
+    Attributes:
+
+        engine (Engine): SQLAlchemy engine connected to the database
+        key (str): The product ID column used to skip existing products
+
+    """
+
+    def __init__(self, engine, key: str = 'Unique Product ID'):
+
+        """
+        See help(BulkLoader) for details
+        """
+
+        self.engine = engine
+        self.key = key
+
+
+    def _target_columns(self, df, table):
+
+        """This method creates the table from the dataframe schema if it does
+        not exist yet and returns the columns the rows are copied into
+
+        Args:
+            df (DataFrame): The products to load, including the index column
+            table (str): The name of the target table
+
+        Returns:
+            list: The columns shared by the table and the dataframe
+        """
+
+        with self.engine.connect() as conn:
+            columns = [row[0] for row in conn.execute(text(
+                '''SELECT column_name FROM information_schema.columns
+                   WHERE table_name = :table ORDER BY ordinal_position'''),
+                {'table': table})]
+
+        if not columns:
+            # Same schema as DataFrame.to_sql would have created
+            df.set_index('index').head(0).to_sql(table, self.engine)
+            columns = list(df.columns)
+
+        return [column for column in columns if column in df.columns]
+
+
+    def load(self, df, table: str):
+
+        """This method copies the products into the table
+
+        Args:
+            df (DataFrame): Pandas dataframe containing all product information
+            which was scraped
+            table (str): The name of the target table
+
+        Returns:
+            int: The number of products inserted
+        """
+
+        start = time.perf_counter()
+        df = df.reset_index()
+        columns = self._target_columns(df, table)
+        column_list = ', '.join(f'"{column}"' for column in columns)
+
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            cursor.execute(f'CREATE TEMP TABLE staging_products '
+                           f'(LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DROP')
+            cursor.copy_expert(
+                f'COPY staging_products ({column_list}) FROM STDIN WITH (FORMAT csv)',
+                _CsvStream(df[columns].itertuples(index=False, name=None)))
+            # Products already in the table (or twice in this batch) are
+            # skipped, whether or not the key column has a unique index
+            cursor.execute(
+                f'''INSERT INTO "{table}" ({column_list})
+                    SELECT DISTINCT ON (s."{self.key}") {', '.join(f's."{c}"' for c in columns)}
+                    FROM staging_products s
+                    WHERE NOT EXISTS (SELECT 1 FROM "{table}" t
+                                      WHERE t."{self.key}" = s."{self.key}")
+                    ON CONFLICT DO NOTHING''')
+            inserted = cursor.rowcount
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        elapsed = time.perf_counter() - start
+        rate = len(df) / elapsed if elapsed else float('inf')
+        print(f'Loaded {inserted} new of {len(df)} rows into {table} '
+              f'in {elapsed:.2f}s ({rate:.0f} rows/s)')
+        return inserted
+
+
+class _CsvStream():
+
+    """A file-like object producing CSV text from an iterator of rows as
+    psycopg2 reads it, hence the rows are never held in memory as a single
+    CSV string.
+
+    Args:
+        rows (iterator): Tuples of column values
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(['' if value is None else value for value in row])
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            size = len(self.pending)
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
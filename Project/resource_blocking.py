@@ -0,0 +1,90 @@
+# Import all necessary packages
+
+import os
+
+
+# URL patterns (wildcards as understood by Network.setBlockedURLs) of every
+# kind of resource the scraper does not need to read the text of a page
+RESOURCE_PATTERNS = {
+
+    'images': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*',
+               '*.ico*'],
+    'fonts': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*'],
+    'css': ['*.css*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*'],
+    'third_party': ['*amazon-adsystem.com*', '*doubleclick.net*',
+                    '*googlesyndication.com*', '*google-analytics.com*',
+                    '*fls-eu.amazon.co.uk*', '*unagi.amazon.co.uk*',
+                    '*unagi-eu.amazon.com*', '*aax-eu.amazon*'],
+}
+
+
+# Reads the bytes transferred for the document and every resource of the
+# current page from the Resource Timing API and clears the buffer for the
+# next page. Cross-origin resources without Timing-Allow-Origin report 0,
+# hence the numbers are a lower bound.
+PAGE_BYTES_JS = """
+var total = 0;
+var entries = performance.getEntriesByType('navigation')
+    .concat(performance.getEntriesByType('resource'));
+for (var i = 0; i < entries.length; i++) {
+    total += entries[i].transferSize || 0;
+}
+performance.clearResourceTimings();
+return total;
+"""
+
+
+def _env_list(name, default=''):
+    return [item.strip() for item in os.getenv(name, default).split(',')
+            if item.strip()]
+
+
+def blocked_url_patterns():
+
+    """This function builds the deny list from the resource kinds in the
+    block_resources environment variable (e.g., 'images,fonts,third_party')
+    plus the patterns in blocked_urls. There is no allow list, as
+    Network.setBlockedURLs drops every request matching any of the patterns,
+    hence a kind which is needed, e.g., css, is left out of block_resources.
+
+    Returns:
+        list: The URL patterns to block, empty if blocking is switched off
+    """
+
+    patterns = []
+    for kind in _env_list('block_resources'):
+        patterns.extend(RESOURCE_PATTERNS.get(kind.lower(), []))
+    patterns.extend(_env_list('blocked_urls'))
+    return list(dict.fromkeys(patterns))
+
+
+def apply_chrome_prefs(chrome_options):
+
+    """This function switches off images through the Chrome preferences when
+    images are blocked, which also stops them from being decoded. It works
+    for both headless and normal Chrome.
+
+    Args:
+        chrome_options (ChromeOptions): The options Chrome is started with
+    """
+
+    if 'images' in [kind.lower() for kind in _env_list('block_resources')]:
+        chrome_options.add_experimental_option(
+            'prefs', {'profile.managed_default_content_settings.images': 2})
+
+
+def block_urls(driver):
+
+    """This function tells Chrome through the DevTools protocol to drop every
+    request matching the deny list. It has to run before the first page is
+    loaded.
+
+    Args:
+        driver (WebDriver): The Chrome driver
+    """
+
+    patterns = blocked_url_patterns()
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
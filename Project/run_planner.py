@@ -0,0 +1,275 @@
+# Import all necessary packages
+
+import os
+from typing import Union
+
+import pandas as pd
+from pydantic import validate_arguments
+from sqlalchemy import text
+
+from categories import ListingCrawler
+from checkpoint import CheckpointJournal
+from image_downloader import ImageDownloader
+from scraper_module_1 import AmazonUKScraper
+from metrics import inc
+from product_ids import canonical_url
+
+
+# Column listing every product list a product was found in
+SOURCE_COLUMN = 'Source Lists'
+
+
+class RunPlanner():
+
+    """This class scrapes several product lists and categories, e.g., the
+    best sellers and the most wished for computers, in a single run. The
+    lists share the browser sessions, the RDS connection and the dedup index
+    of one Run_Scraper. A product found in several lists is scraped once and
+    written to the table of every list it was found in, with the lists
+    recorded in the Source Lists column, e.g.,
+    "best seller: computer & accessories|most wished for: computer & accessories".
+
+    Attributes:
+
+        run (Run_Scraper): The scraper whose sessions, connection and
+        settings are shared by the lists
+        plan (list): (options, items) pairs of the lists to scrape
+
+    """
+
+    def __init__(self, run, plan: list):
+
+        """
+        See help(RunPlanner) for details
+        """
+
+        if not plan:
+            raise ValueError('The run plan has no product lists')
+        self.run = run
+        self.plan = list(dict.fromkeys(
+            (options.strip().lower(), items.strip().lower()) for options, items in plan))
+        self.dedups = {}
+
+
+    def _discover(self):
+
+        """This method collects the product links of every list. Over HTTP
+        the listings are crawled at the same time, with Chrome they are
+        visited one after the other with the same session.
+
+        Returns:
+            dict: The links of every (options, items) pair
+        """
+
+        if os.getenv('link_discovery', 'selenium').lower() == 'http':
+            registry = self.run.scraper.registry
+            urls = {pair: registry.list_url(*pair) for pair in self.plan}
+            crawler = ListingCrawler(max_pages=int(os.getenv('max_pages') or 0) or None)
+            crawled = crawler.crawl_many(list(dict.fromkeys(urls.values())))
+            return {pair: crawled[url] for pair, url in urls.items()}
+
+        links = {}
+        for options, items in self.plan:
+            self.run.switch_list(options, items)
+            links[(options, items)] = self.run._discover_links()
+        return links
+
+
+    def _dedup(self, options: str, bootstrap: bool):
+
+        """This method returns the dedup index of the table of a list,
+        created once per table and sharing the RDS connection"""
+
+        table = self.run._table_name(options)
+        if table not in self.dedups:
+            self.run.switch_list(options, self.run.items)
+            self.dedups[table] = self.run._dedup_index(self.run._connect(), bootstrap)
+        return self.dedups[table]
+
+
+    def _merge(self, links: dict, n):
+
+        """This method merges the links of every list, leaving out products
+        already stored in the table of every list they were found in
+
+        Args:
+            links (dict): The links of every (options, items) pair
+            n (int, str): How many products to take from every list or 'all'
+
+        Returns:
+            dict: The link, the lists the product was found in and the lists
+            whose table is missing it, keyed by product ID, in the order the
+            products were first found
+        """
+
+        try:
+            empty_existing_data = os.getenv('start_empty')
+        except:
+            empty_existing_data = input('Do you want to start from an empty dictionary: ').lower()
+        bootstrap = empty_existing_data == 'no'
+
+        products = {}
+        found = 0
+        for pair, pair_links in links.items():
+            if n != 'all':
+                pair_links = pair_links[0:n]
+            found += len(pair_links)
+            for link in pair_links:
+                product_id = AmazonUKScraper._unique_id_gen(link)
+                entry = products.setdefault(product_id, {'link': canonical_url(link),
+                                                         'lists': []})
+                if pair not in entry['lists']:
+                    entry['lists'].append(pair)
+        print(f'{len(products)} products in {found} links of {len(links)} lists')
+        inc('scraper_skipped_total', found - len(products), reason='duplicate_link')
+
+        # Every table is looked up once for all the products of its lists
+        candidates = {}
+        for product_id, entry in products.items():
+            for options, _ in entry['lists']:
+                candidates.setdefault(options, set()).add(product_id)
+        stored = {}
+        for options, product_ids in candidates.items():
+            dedup = self._dedup(options, bootstrap)
+            stored[options] = dedup.seen(product_ids) if bootstrap else set()
+
+        for product_id, entry in list(products.items()):
+            entry['missing'] = [(options, items) for options, items in entry['lists']
+                                if product_id not in stored[options]]
+            if not entry['missing']:
+                print('Already scraped this product')
+                inc('scraper_skipped_total', reason='already_scraped')
+                del products[product_id]
+
+        return products
+
+
+    @validate_arguments
+    def run_plan(self, n: Union[int, str]):
+
+        """This method scrapes every list of the plan and saves the products
+        of every table like dump_json_image_upload does: in
+        data_<table>.json, the images_<options> folder and, if the cloud is
+        updated, RDS and S3. A run which was interrupted carries on where it
+        stopped (see help(CheckpointJournal)).
+
+        Args:
+            n (int, str): How many products to take from every list or 'all'
+
+        Returns:
+            dict: The DataFrame of the products written to every table
+        """
+
+        raw_dir = os.getcwd()
+        journal = CheckpointJournal(
+            os.path.join(raw_dir, 'checkpoint_plan.jsonl'),
+            max_age_hours=float(os.getenv('checkpoint_max_age_hours', 12)))
+        self.run.journal = journal
+
+        products = self._merge(self._discover(), n)
+        links = [entry['link'] for entry in products.values()]
+        journal.start(links)
+
+        remaining = [link for link in links if link not in journal.completed]
+        if len(remaining) < len(links):
+            print(f'Resuming from checkpoint with {len(journal.completed)} '
+                  'products already scraped')
+        for row in self.run._iter_rows(remaining):
+            journal.record(row)
+            inc('scraper_products_total')
+
+        completed = {row['Page Link']: row for row in journal.resumed(links)}
+        rows = {}
+        for product_id, entry in products.items():
+            row = dict(completed[entry['link']])
+            row[SOURCE_COLUMN] = '|'.join(f'{options}: {items}'
+                                          for options, items in entry['lists'])
+            # Categories of the same list type share a table, hence a product
+            # found in both is written to it once
+            tables = {}
+            for options, items in entry['missing']:
+                tables.setdefault(self.run._table_name(options), (options, items))
+            for table, (options, items) in tables.items():
+                rows.setdefault(table, (options, items, []))[2].append(row)
+
+        try:
+            update = os.getenv('update_cloud').lower()
+        except:
+            update = input('Update data in cloud? ').lower()
+
+        frames = {}
+        for table, (options, items, table_rows) in rows.items():
+            self.run.switch_list(options, items)
+            frames[table] = self._save(raw_dir, table_rows, update == 'yes')
+
+        self.run._report_run()
+        # Everything is saved, hence the next run starts from scratch
+        journal.finish()
+        return frames
+
+
+    def _save(self, raw_dir: str, rows: list, update: bool):
+
+        """This method saves the products of the table of the current list
+
+        Args:
+            raw_dir (str): The path of the raw_data folder
+            rows (list): The product information to write to the table
+            update (bool): Whether RDS and S3 are updated
+
+        Returns:
+            DataFrame: The products which were written
+        """
+
+        table = self.run._table_name()
+        data_file = 'data_' + table + '.json'
+        df_prod = pd.DataFrame(rows)
+        df_prod.to_json(os.path.join(raw_dir, data_file))
+        self.run._write_parquet(df_prod)
+
+        image_dir = os.path.join(raw_dir, 'images_' + self.run.options)
+        os.makedirs(image_dir, exist_ok=True)
+        downloader = ImageDownloader(image_dir,
+                                     workers=int(os.getenv('image_workers', 8)))
+        downloader.download_all(df_prod['Unique Product ID'], df_prod['Image link'])
+
+        if update:
+            self._add_source_column(table)
+            self.run.dedup = self.dedups[table]
+            self.run._upload_dataframe_rds(df_prod)
+            self.run._sync_to_s3(raw_dir, [data_file] + self.run.parquet_files)
+        return df_prod
+
+
+    def _add_source_column(self, table: str):
+
+        """This method adds the Source Lists column to a table created by a
+        run without a plan, so the products can be appended to it"""
+
+        with self.run._connect().begin() as connection:
+            connection.execute(text(
+                f'ALTER TABLE IF EXISTS "{table}" '
+                f'ADD COLUMN IF NOT EXISTS "{SOURCE_COLUMN}" TEXT'))
+
+
+def parse_plan(plan: str):
+
+    """This function reads a run plan such as
+    'best seller:computer & accessories;most wished for:computer & accessories'
+
+    Args:
+        plan (str): options:items pairs separated by semicolons
+
+    Returns:
+        list: The (options, items) pairs
+    """
+
+    pairs = []
+    for entry in plan.split(';'):
+        if not entry.strip():
+            continue
+        options, sep, items = entry.partition(':')
+        if not sep or not items.strip():
+            raise ValueError(f'Expected options:items in the run plan, got {entry!r}')
+        pairs.append((options.strip(), items.strip()))
+    return pairs
@@ -0,0 +1,193 @@
+# Import all necessary packages
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+
+
+class S3Sync():
+
+    """This class uploads a local directory to an S3 bucket prefix, skipping
+    files which are already there unchanged. The bucket prefix is listed once
+    and every local file is compared by size and, through a local manifest of
+    MD5 hashes, by content. New or changed files are uploaded in parallel
+    with multipart transfers for large files.
+
+    The S3 client is passed in, hence the class can be tested against a local
+    stand-in of S3 such as moto.
+
+    Attributes:
+
+        s3 (S3.Client): The boto3 S3 client
+        bucket_name (str): The name of the bucket
+        workers (int): Number of files uploaded at the same time
+        transfer_config (TransferConfig): Multipart settings of every upload
+        manifest_name (str): Name of the manifest file kept in the synced
+        directory
+
+    """
+
+    def __init__(self, s3, bucket_name: str, workers: int = 8,
+                 multipart_threshold: int = 8 * 1024 * 1024,
+                 multipart_chunksize: int = 8 * 1024 * 1024,
+                 manifest_name: str = '.s3_manifest.json'):
+
+        """
+        See help(S3Sync) for details
+
+        Args:
+            multipart_threshold (int): Files of at least this many bytes are
+            uploaded in parts
+            multipart_chunksize (int): Size of every part in bytes
+        """
+
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.manifest_name = manifest_name
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=workers)
+
+
+    def list_remote(self, prefix: str, recursive: bool = False):
+
+        """This method lists every object directly under a bucket prefix 
+        once, objects in deeper 'directories' are left out unless recursive
+
+        Args:
+            prefix (str): The bucket prefix e.g., raw_data/images_best seller/
+            recursive (bool): Whether objects in deeper 'directories' are
+            listed as well, e.g., products/date=.../part-....parquet
+
+        Returns:
+            dict: The size and ETag of every object keyed by object key
+        """
+
+        remote = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        options = {} if recursive else {'Delimiter': '/'}
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix,
+                                       **options):
+            for obj in page.get('Contents', []):
+                remote[obj['Key']] = {'size': obj['Size'],
+                                      'etag': obj['ETag'].strip('"')}
+        return remote
+
+
+    @staticmethod
+    def _md5(path):
+
+        """This method hashes a file in chunks of 1MB
+
+        Args:
+            path (str): The path of the file
+
+        Returns:
+            str: The hex MD5 hash of the file
+        """
+
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+
+    def _load_manifest(self, directory):
+        path = os.path.join(directory, self.manifest_name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {}
+
+
+    def _save_manifest(self, directory, manifest):
+        with open(os.path.join(directory, self.manifest_name), 'w') as f:
+            json.dump(manifest, f)
+
+
+    def changed_files(self, directory: str, prefix: str, names=None):
+
+        """This method finds the local files which are missing or different
+        in the bucket. Single part uploads have the MD5 of the file as their
+        ETag; for multipart uploads the ETag recorded in the manifest at
+        upload time is compared instead.
+
+        Args:
+            directory (str): The local directory to sync
+            prefix (str): The bucket prefix the files are uploaded to
+            names (list, None): Only consider these file names, by default
+            every file in the directory. Names may contain subdirectories,
+            e.g., products/date=.../part-....parquet
+
+        Returns:
+            list: (file name, md5) pairs of the files which need uploading
+        """
+
+        if names is not None and not names:
+            return []
+        nested = names is not None and any('/' in name for name in names)
+        remote = self.list_remote(prefix, recursive=nested)
+        manifest = self._load_manifest(directory)
+        changed = []
+        if names is None:
+            names = sorted(os.listdir(directory))
+        for name in names:
+            path = os.path.join(directory, name)
+            # Downloads in progress are written to .part files first
+            if name == self.manifest_name or name.endswith('.part') \
+                    or not os.path.isfile(path):
+                continue
+            try:
+                md5 = self._md5(path)
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                # Removed or renamed while it was being hashed
+                continue
+            obj = remote.get(prefix + name)
+            if obj is not None and obj['size'] == size:
+                known = manifest.get(name, {})
+                if obj['etag'] == md5 or (known.get('md5') == md5 and
+                                          known.get('etag') == obj['etag']):
+                    continue
+            changed.append((name, md5))
+        return changed
+
+
+    def sync(self, directory: str, prefix: str, names=None):
+
+        """This method uploads the new or changed files of a directory
+
+        Args:
+            directory (str): The local directory to sync
+            prefix (str): The bucket prefix the files are uploaded to,
+            ending with a slash
+            names (list, None): Only sync these file names, by default every
+            file in the directory
+
+        Returns:
+            int: The number of files uploaded
+        """
+
+        changed = self.changed_files(directory, prefix, names)
+
+        def upload(item):
+            name, md5 = item
+            self.s3.upload_file(os.path.join(directory, name), self.bucket_name,
+                                prefix + name, Config=self.transfer_config)
+            etag = self.s3.head_object(Bucket=self.bucket_name,
+                                       Key=prefix + name)['ETag'].strip('"')
+            return name, {'md5': md5, 'etag': etag}
+
+        manifest = self._load_manifest(directory)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for name, entry in pool.map(upload, changed):
+                manifest[name] = entry
+        self._save_manifest(directory, manifest)
+
+        return len(changed)
@@ -1,19 +1,33 @@
 # Import all necessary packages
 
-import time
 import uuid
 import os
+import time
 from pydantic import validate_arguments
 from selenium import webdriver
 from selenium.webdriver import ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from typing import Optional
+
+from field_selectors import FIELD_DEFAULTS, FIELD_ORDER
+from field_selectors import apply_transform, selector_chains
+from field_selectors import BATCH_EXTRACT_JS
+from latency import LatencyBudget
+from driver_pool import chromedriver_path, profile_is_warm, mark_profile_warm
+from resource_blocking import apply_chrome_prefs, block_urls, PAGE_BYTES_JS
+from categories import CategoryRegistry, ListingCrawler
+from metrics import instrument, inc, observe
+from selector_registry import shared_registry
+from page_cache import shared_cache
+from product_ids import product_id
 
 
 from dotenv import load_dotenv
@@ -33,22 +47,52 @@ class AmazonUKScraper():
     Attributes:
 
         options (str): Category of products  i.e., Best Seller/Most Wished For
-        items (str): Which type of product e.g., "Computer & Accessories"
+        items (str): Which type of product e.g., "Computer & Accessories" or
+        the name of any other best seller department
         headless (bool): Headless mode being on or off whilst running scraper
         url (str): The url of the desired website
+        create_dir (bool): Whether to create and change into the raw_data
+        directory; extra worker scrapers share the directory of the first one
+        profile_dir (str, None): Persistent Chrome profile directory, which 
+        keeps the cookies and region between runs
         metadata_dict (dict, None): dictionary will contain metadata 
         individual products from Amazon
+        latency (LatencyBudget): Time spent waiting for the browser compared
+        to time spent working
+        extract_engine (str): 'element' to look up every XPATH with its own
+        find_element call or 'batch' to run all of them in the browser with 
+        a single execute_script call, read from the extract_engine 
+        environment variable
 
     """
 
+    # Default number of seconds to wait for each step, which can be changed
+    # with the wait_<step> environment variables e.g., wait_product='5'
+    WAIT_TIMEOUTS = {
+                    'cookies': 2,
+                    'region': 5,
+                    'grid': 10,
+                    'next_page': 5,
+                    'product': 10,
+                    'reviews': 2
+                    }
+
     @validate_arguments
-    def __init__(self, options: str, items: (str), url: (str), headless: bool): 
+    def __init__(self, options: str, items: (str), url: (str), headless: bool,
+                 create_dir: bool = True, profile_dir: Optional[str] = None): 
         
         """
         See help(AmazonUKScraper) for details
         """
 
-        s = Service(ChromeDriverManager().install())
+        self.latency = LatencyBudget()
+        # Whether the time spent setting up the session was reported by a run
+        self.setup_reported = False
+        self.extract_engine = os.getenv('extract_engine', 'element').lower()
+        self.selectors = shared_registry()
+        self.registry = CategoryRegistry(
+            ttl_hours=float(os.getenv('category_ttl_hours', 168)))
+        s = Service(chromedriver_path())
         
         self.url = url
         self.options = options.lower() # To keep input text consistent
@@ -56,15 +100,12 @@ class AmazonUKScraper():
     
                     
 
+        chrome_options = ChromeOptions()
         if headless:
     
-            chrome_options = ChromeOptions()
             chrome_options.add_argument("--headless")
             chrome_options.add_argument("--no-sandbox")
             chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_prefs = {}
-            chrome_options.experimental_options["prefs"] = chrome_prefs
-            chrome_prefs["profile.default_content_settings"] = {"images": 2}
 
             chrome_options.add_argument('--ignore-certificate-errors')
             chrome_options.add_argument('--allow-running-insecure-content') 
@@ -74,32 +115,71 @@ class AmazonUKScraper():
             # chrome_options.add_argument("--headless")
             # chrome_options.add_argument("--disable-dev-shm-usage")
             chrome_options.add_argument("window-size=1980,1000")
-            self.driver = webdriver.Chrome(service=s, chrome_options=chrome_options)
-        else:
-            self.driver = webdriver.Chrome(service=s)
 
-        self.driver.get(url)
-        # open and bypass cookies 
-        self._accept_cookies()
-        # change region if necessary 
-        self._change_region()
+        if profile_dir is not None:
+            # Cookies and the region are kept in a persistent Chrome profile
+            chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+        # Images, fonts, ads etc. are not needed to read the product data
+        apply_chrome_prefs(chrome_options)
+        start = time.perf_counter()
+        self.driver = webdriver.Chrome(service=s, options=chrome_options)
+        observe('scraper_driver_startup_seconds', time.perf_counter() - start)
+        block_urls(self.driver)
+
+        if profile_dir is not None and profile_is_warm(profile_dir):
+            # The profile already has the cookies accepted and region set
+            pass
+        else:
+            self.driver.get(url)
+            # open and bypass cookies 
+            self._accept_cookies()
+            # change region if necessary 
+            self._change_region()
+            if profile_dir is not None:
+                mark_profile_warm(profile_dir)
         # creates a raw_data directory to save all the data
-        self._create_raw_data_dir('raw_data')
+        if create_dir:
+            self._create_raw_data_dir('raw_data')
         
 
 
+    def _wait_for(self, condition, step: str):
+
+        """This method waits until the given expected condition is met instead
+        of sleeping for a fixed amount of time. The time spent waiting is 
+        added to the latency budget of the step.
+
+        Args:
+            condition (callable): An expected condition e.g., 
+            EC.element_to_be_clickable((By.XPATH, xpath))
+            step (str): The name of the step which sets the timeout
+
+        Returns:
+            The value returned by the condition, normally the element
+
+        Raises:
+            TimeoutException: If the condition is not met within the timeout
+        """
+
+        timeout = float(os.getenv('wait_' + step, self.WAIT_TIMEOUTS[step]))
+        with self.latency.waiting(step):
+            return WebDriverWait(self.driver, timeout).until(condition)
+
+
+    @instrument
     def _accept_cookies(self):
 
         """This method locates and accepts cookies if any"""
 
         try: # if cookies present
-            time.sleep(1)
             cookies_xpath = '//span[@class="a-button a-button-primary"]'
-            self.driver.find_element(by=By.XPATH, value=cookies_xpath).click()
+            self._wait_for(EC.element_to_be_clickable((By.XPATH, cookies_xpath)), 
+                           'cookies').click()
 
-        except NoSuchElementException:
+        except (NoSuchElementException, TimeoutException):
             pass
         
+    @instrument
     def _change_region(self):
     
         """This method ensures the region is set to the UK when working with  
@@ -112,30 +192,71 @@ class AmazonUKScraper():
         # Some regions maybe not have best sellers or most wished for options
         
         region = os.getenv('region_change')
-        time.sleep(1)
         if str(region).lower() == "yes":
-            time.sleep(1)
             region_xpath = '//div[@id="nav-global-location-slot"]'
             # Locate the region button and click
-            self.driver.find_element(by=By.XPATH, value=region_xpath).click()
+            self._wait_for(EC.element_to_be_clickable((By.XPATH, region_xpath)), 
+                           'region').click()
             
-            time.sleep(2)
             # Find the input text element
             text_xpath = '//input[@class="GLUX_Full_Width a-declarative"]'
-            s = self.driver.find_element(by=By.XPATH, value=text_xpath) 
+            s = self._wait_for(EC.element_to_be_clickable((By.XPATH, text_xpath)), 
+                               'region')
             s.click()
             
-            time.sleep(1)
             s.send_keys('CV47AL')  # send an example UK postcode
-            time.sleep(1) 
             s.send_keys(Keys.ENTER) # Press Enter with the example code 
-            time.sleep(1)
             # Submit the code 
             submit_xpath = '//input[@type="submit"]'
-            self.driver.find_element(by=By.XPATH, value=submit_xpath).submit() 
+            self._wait_for(EC.presence_of_element_located((By.XPATH, submit_xpath)), 
+                           'region').submit() 
         else:
             pass
 
+    def _page_bytes(self):
+
+        """This method returns the bytes transferred for the current page 
+        since the previous call, useful to measure what blocking resources
+        saves
+
+        Returns:
+            int: Bytes transferred for the document and its resources
+        """
+
+        try:
+            page_bytes = int(self.driver.execute_script(PAGE_BYTES_JS) or 0)
+        except WebDriverException:
+            return 0
+        inc('scraper_page_bytes_total', page_bytes, engine='chrome')
+        return page_bytes
+
+    @instrument
+    def _wait_for_product_page(self):
+
+        """This method waits until the title of a product page is shown, 
+        scrolls to the bottom and waits for the image and the reviews which 
+        are loaded lazily. Products without reviews only cost the (short) 
+        reviews timeout.
+        """
+
+        try:
+            self._wait_for(EC.presence_of_element_located(
+                (By.XPATH, '//span[@id="productTitle"]')), 'product')
+        except TimeoutException:
+            # Let retrieve_details_from_a_page report what is missing
+            return
+
+        self._scroll_bottom()
+        try:
+            self._wait_for(EC.presence_of_element_located(
+                (By.XPATH, '//div[@class="imgTagWrapper"]//img')), 'product')
+            self._wait_for(EC.any_of(
+                EC.presence_of_element_located((By.XPATH, '//div[@data-hook="total-review-count"]')),
+                EC.presence_of_element_located((By.XPATH, '//div[@id="cm-cr-dp-review-list"]'))),
+                'reviews')
+        except TimeoutException:
+            pass
+
     def _scroll_bottom(self):
 
         """This function scrolls to the bottom of the webpage; useful for 
@@ -145,6 +266,7 @@ class AmazonUKScraper():
         self.driver.execute_script(scroll_bottom)
 
 
+    @instrument
     def _find_container_elements(self):
 
         """This method locates all products and saves their XPATHS into a list. 
@@ -154,12 +276,19 @@ class AmazonUKScraper():
             a html container
 
         """
-        time.sleep(1)
-        page_button = self.driver.find_element(by=By.XPATH, value='//li[@class="a-normal"]')
-        page_button.location_once_scrolled_into_view   # Scrolls and waits until the bottom page button appears in view to the scraper
-        time.sleep(1)
-        prop_container = self.driver.find_element(by=By.XPATH, value='//div[@class="p13n-gridRow _cDEzb_grid-row_3Cywl"]')
-        prop_list = prop_container.find_elements(by=By.XPATH, value='./div[@id="gridItemRoot"]')
+        prop_container = self._wait_for(EC.presence_of_element_located(
+            (By.XPATH, '//div[@class="p13n-gridRow _cDEzb_grid-row_3Cywl"]')), 'grid')
+        # A listing of a single page has no page buttons, hence the bottom of
+        # the page is scrolled into view without waiting for them
+        page_buttons = self.driver.find_elements(By.XPATH, '//ul[@class="a-pagination"]')
+        if page_buttons:
+            page_buttons[0].location_once_scrolled_into_view
+        else:
+            self._scroll_bottom()
+        # The products further down the page are loaded once scrolled into 
+        # view so we wait until the number of products stops changing
+        prop_list = self._wait_for(_settled_elements(
+            prop_container, (By.XPATH, './div[@id="gridItemRoot"]')), 'grid')
 
         return prop_list
 
@@ -189,6 +318,7 @@ class AmazonUKScraper():
         return link_list
 
 
+    @instrument
     def _get_all_links(self):
 
         """This function sets the correct url and scrapes links of products
@@ -199,49 +329,89 @@ class AmazonUKScraper():
 
         """
 
-        if self.options == "best seller":
-            if self.items == "computer & accessories":
-
-                self.driver.get('https://www.amazon.co.uk/Best-Sellers-Computers-Accessories/zgbs/computers/ref=zg_bs_nav_0')
-
+        # The url of any best seller or most wished for category is looked 
+        # up in the category registry
+        list_url = self.registry.list_url(self.options, self.items)
+        max_pages = os.getenv('max_pages')
+        cache = shared_cache()
+        if cache is not None:
+            cached = self._cached_links(cache, list_url, max_pages)
+            if cached is not None:
+                return cached
 
-        elif self.options == "most wished for":   
-            if self.items == "computer & accessories":
-
-                self.driver.get('https://www.amazon.co.uk/gp/most-wished-for/computers/ref=zg_mw_nav_0')
+        self.driver.get(list_url)
 
         big_list = []
+        pages = 0
         
-        # Two pages of products for every category in 
-        # the best sellers or most wished section
-        for _ in range(2):
+        # Follow the next page button until the last page of the best 
+        # sellers or most wished section
+        while True:
 
             prop_links = self._find_container_elements()
             l = self._get_links_per_page(prop_links)
             big_list.extend(l)
+            if cache is not None:
+                cache.put(self.driver.current_url, self.driver.page_source, rendered=True)
+            pages += 1
+            if max_pages and pages >= int(max_pages):
+                break
+            # The next button is disabled (no link) on the last page
+            if not self.driver.find_elements(By.XPATH, '//li[@class="a-last"]/a'):
+                break
             try:
-                time.sleep(2)
-                button = self.driver.find_element(by=By.XPATH, value='//li[@class="a-last"]')
-                                                  
-                element = WebDriverWait(self.driver, 2).until\
-                (EC.element_to_be_clickable(button))
+                element = self._wait_for(EC.element_to_be_clickable(
+                    (By.XPATH, '//li[@class="a-last"]')), 'next_page')
                 
                 element.click()
-                time.sleep(1)
+                # The next page has loaded once the products of this page 
+                # are no longer attached to the document
+                if prop_links:
+                    self._wait_for(EC.staleness_of(prop_links[0]), 'next_page')
 
-            except NoSuchElementException:
+            except (NoSuchElementException, TimeoutException):
                 break
 
 
         return big_list
 
 
+    @staticmethod
+    def _cached_links(cache, url, max_pages=None):
+
+        """This function reads the product links of a listing from the page
+        cache, following the next page links of the cached pages
+
+        Args:
+            cache (PageCache): The page cache
+            url (str): The url of the first listing page
+            max_pages (str, None): Maximum number of pages
+
+        Returns:
+            list: The links of the products or None if a page of the listing
+            is not cached, in which case the listing is visited with Chrome
+        """
+
+        links = []
+        pages = 0
+        while url is not None:
+            page_html = cache.get(url, rendered=True)
+            if page_html is None:
+                return None
+            page_links, url = ListingCrawler.parse_listing(page_html, url, rendered=True)
+            links.extend(page_links)
+            pages += 1
+            if max_pages and pages >= int(max_pages):
+                break
+        return links
+
+
     @staticmethod
     def _unique_id_gen(url):
 
         """This function takes in the URL of a product webpage and returns the 
-        unique product id. For example, the format 'pd_rd_i=XXXXXXXXX&psc=N'
-        is given in every URL and thus, we extract the string XXXXXXXXX.
+        unique product id, the ASIN of the product, read from the /dp/XXXXXXXXXX
+        path or the pd_rd_i=XXXXXXXXXX query (see help(product_id)).
 
         Args:
             url (str): The url of a given product
@@ -251,11 +421,7 @@ class AmazonUKScraper():
             url argument.
         """
 
-        # The .find method locates the first index of the required 
-        # unique ID and the actual characters are found after 8 characters 
-        product_id = url[url.find('pd_rd_i')+8: -6]
-
-        return str(product_id)
+        return product_id(url)
 
 
 
@@ -276,11 +442,12 @@ class AmazonUKScraper():
         return str(uuid_4)  
 
 
+    @instrument
     def retrieve_details_from_a_page(self):
 
         """This function inspects various properties of a product 
         e.g., title, price, brand, reviews, image src link and more
-        using multiple try-except statements
+        using a chain of fallback XPATHS for every field
 
         Returns:
 
@@ -289,112 +456,163 @@ class AmazonUKScraper():
         """
 
         # There are some elements such as price or voucher which sometimes 
-        # differ in location depending on the 
-        # product and hence, we use multiple try and except statements 
-        # to locate these if they exist. 
+        # differ in location depending on the product and hence, every field
+        # has a chain of XPATHS (see field_selectors.py) which are tried in 
+        # order until one of them is found
 
-        # Title of the product
-        try:
-            title = self.driver.find_element(By.XPATH, '//span[@id="productTitle"]').text
-        except NoSuchElementException:
-            title = 'N/A'
+        if self.extract_engine == 'batch':
+            details = self._extract_batch()
+        else:
+            details = self._extract_elements()
 
-        # Price of the product
-        try:
-            price = self.driver.find_element(By.XPATH, '//span[@class="a-price a-text-price header-price a-size-base a-text-normal"]').text
-        except NoSuchElementException:
-            try:
-                price = self.driver.find_element(By.XPATH, '//span[@class="a-size-medium a-color-price priceBlockBuyingPriceString"]').text.replace('\n', '.')
-            except:
-                price = 'N/A'  # Different products have prices shown on different locations (normally it could be three places, hence we use the try except statement)
+        # Below, we know for certain that the main image exists
+        if details['src'] is None:
+            raise NoSuchElementException('Main image of the product not found')
 
+        return tuple(details[field] for field in FIELD_ORDER)
 
-        if price == 'N/A':
 
-            try:
-                price = self.driver.find_element(By.XPATH, '//span[@class="a-price aok-align-center reinventPricePriceToPayMargin priceToPay"]').text.replace('\n', '.')
-            except NoSuchElementException:
+    def _extract_elements(self, record: bool = True):
 
-                try:
-                    price = self.driver.find_element(By.XPATH, '//td[@class="a-span12"]').text
-                except:
-                    try:
-                        price = self.driver.find_element(By.XPATH, '//span[@data-maple-math="cost"]').text
-                    except NoSuchElementException:
-                        price = 'N/A'
+        """This method reads every field with separate find_element calls, 
+        costing one round-trip to chromedriver per XPATH tried
 
-        # Similar to price, we find the same problems with Brand, Voucher, Promotion and hence we perform multiple try except statements
+        Args:
+            record (bool): Whether the matched selectors are counted in the
+            selector registry
 
-        # Brand
-        try:
-            brand = self.driver.find_element(By.XPATH, '//tr[@class="a-spacing-small po-brand"]').text.split(' ')[1]
-        except:
-            brand = 'N/A'
-        # Voucher available
-        try:
-            voucher = self.driver.find_element(by=By.XPATH, value='//span[@class="promoPriceBlockMessage"]').text.split('\n')[1]
-        except:
-            try:
-                voucher = self.driver.find_element(By.XPATH, '//div[@data-csa-c-slot-id="promo-cxcw-0-0"]').text
-            except NoSuchElementException:
-                voucher = 'N/A'
+        Returns:
+            dict: The value of every field keyed by field name
+        """
 
-        # Percentage reduction in price
-        # These reductions are found at different places depending on the link and hence we used several try and excepts here
-        try:
-            price_override = self.driver.find_element(By.XPATH, '//span[@class="a-size-large a-color-price savingPriceOverride aok-align-center reinventPriceSavingsPercentageMargin savingsPercentage"]').text
+        return {field: self._first_match(field, record) for field in FIELD_ORDER}
 
-        except NoSuchElementException:
-            price_override = 'N/A'
 
-        if price_override == 'N/A':
-            try:
-                price_override = self.driver.find_element(By.XPATH, '//td[@class="a-span12 a-color-price a-size-basepriceBlockSavingsString"]').text
-            except NoSuchElementException:
-                price_override = 'N/A'
+    def _extract_batch(self, record: bool = True):
+
+        """This method sends the XPATH chains of every field to the browser
+        and reads all of them in a single execute_script call
+
+        Args:
+            record (bool): Whether the matched selectors are counted in the
+            selector registry
+
+        Returns:
+            dict: The value of every field keyed by field name
+        """
+
+        chains = self.selectors.chains()
+        found = self.driver.execute_script(BATCH_EXTRACT_JS, 
+                                           selector_chains(chains))
+        details = {}
+        for field in FIELD_ORDER:
+            value = found['values'].get(field)
+            details[field] = FIELD_DEFAULTS[field] if value is None else value
+            matched = found['matched'].get(field)
+            if record:
+                self.selectors.record(
+                    field, None if matched is None else chains[field][matched])
+
+        return details
+
+
+    def benchmark_extraction(self, repeats: int = 3):
+
+        """This method compares both extraction engines on the current page by
+        counting the WebDriver round-trips and timing each of them
+
+        Args:
+            repeats (int): How many times each engine reads the page
+
+        Returns:
+            dict: Round-trips and milliseconds per page of each engine along 
+            with whether both engines read the same values
+        """
 
+        results = {}
+        values = {}
+        for name, extract in (('element', self._extract_elements), 
+                              ('batch', self._extract_batch)):
+            calls = [0]
+            execute = self.driver.execute
 
-        if price_override == 'N/A':
+            def counting_execute(*args, **kwargs):
+                calls[0] += 1
+                return execute(*args, **kwargs)
+
+            # WebElements send their commands through the driver as well so
+            # shadowing execute on the instance counts every round-trip
+            self.driver.execute = counting_execute
             try:
-                price_override = self.driver.find_element(By.XPATH, '//td[@class="a-span12 a-color-price a-size-base"]').text
-            except NoSuchElementException:
-                price_override = 'N/A'
+                start = time.perf_counter()
+                # The page is counted once, by retrieve_details_from_a_page
+                for _ in range(repeats):
+                    values[name] = extract(record=False)
+                elapsed = time.perf_counter() - start
+            finally:
+                del self.driver.execute
 
-        # Below, we know for certain that these elements exist, hence we will not use try-except here
+            results[name] = {
+                            'round_trips': calls[0] / repeats,
+                            'ms_per_page': elapsed * 1000 / repeats
+                            }
 
-        
-        try:
-            # Review ratings
-            review_ratings = self.driver.find_element(By.XPATH, '//span[@class="a-size-medium a-color-base"]').text
-        except:
-            review_ratings = 'No rating'
-        
-        try:  # Number of ratings
-            global_ratings = self.driver.find_element(By.XPATH, '//div[@data-hook="total-review-count"]').text
-        except:
-            global_ratings = 'No global rating'
+        results['same_values'] = values['element'] == values['batch']
+        return results
 
-        try:
-            # Review topics
-            topics_review = self.driver.find_element(by=By.XPATH, value='//div[@class="cr-lighthouse-terms"]').text
-        except:
-            topics_review = 'No review topics'
 
-        try:
-            # Most helpful review
-            first_review = self.driver.find_element(by=By.XPATH, value='//div[@id="cm-cr-dp-review-list"]').find_elements(by=By.XPATH, value='./div[@data-hook="review"]')[0]
-            review_helpful = first_review.find_element(by=By.XPATH, value='//span[@data-hook="review-body"]').text
+    @instrument
+    def probe(self, link, fields):
 
-        except:
-            review_helpful = 'No most helpful review'
+        """This method visits a product page and reads only a few fields, 
+        e.g., to check whether the price changed
 
+        Args:
+            link (str): The url of the product
+            fields (tuple): The fields to read
 
-        # Main Image Link
-        src = self.driver.find_element(By.XPATH, '//div[@class="imgTagWrapper"]').find_element(By.TAG_NAME, 'img').get_attribute('src')
+        Returns:
+            tuple: The values of the fields
+        """
+
+        self.driver.get(link)
+        self._wait_for_product_page()
+        # A changed product is read in full afterwards, which counts the page
+        return tuple(self._first_match(field, record=False) for field in fields)
 
 
-        return title, price, brand, voucher, price_override, review_ratings, \
-               global_ratings, topics_review, review_helpful, src
+    def _first_match(self, field, record: bool = True):
+
+        """This method tries every XPATH of a field in order and returns the
+        value of the first element found on the current page
+
+        Args:
+            field (str): The name of the field e.g., price
+            record (bool): Whether the matched selector is counted in the
+            selector registry
+
+        Returns:
+            str: The value of the field or its default if none are found
+        """
+
+        # Selectors which stopped matching are tried last
+        for selector in self.selectors.chain(field):
+            try:
+                element = self.driver.find_element(By.XPATH, selector.xpath)
+                if selector.attribute is None:
+                    value = element.text
+                else:
+                    value = element.get_attribute(selector.attribute)
+                value = apply_transform(selector, value)
+            except (WebDriverException, IndexError):
+                continue
+            if record:
+                self.selectors.record(field, selector)
+            return value
+
+        if record:
+            self.selectors.record(field, None)
+        return FIELD_DEFAULTS[field]
 
 
     @staticmethod
@@ -415,6 +633,27 @@ class AmazonUKScraper():
         else:
             os.mkdir(name)
             os.chdir(desired_dir)
-            
-            
 
+
+class _settled_elements():
+
+    """An expected condition which is met once the elements matching a locator
+    inside a parent element are present and their number did not change 
+    since the previous poll, e.g., when products are loaded lazily.
+
+    Args:
+        parent (WebElement): The element to search in
+        locator (tuple): The (By, value) pair of the elements
+    """
+
+    def __init__(self, parent, locator):
+        self.parent = parent
+        self.locator = locator
+        self.last_count = -1
+
+    def __call__(self, driver):
+        elements = self.parent.find_elements(*self.locator)
+        count = len(elements)
+        settled = count > 0 and count == self.last_count
+        self.last_count = count
+        return elements if settled else False
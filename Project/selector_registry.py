@@ -0,0 +1,223 @@
+# Import all necessary packages
+
+import json
+import os
+import threading
+
+from field_selectors import FIELD_SELECTORS, FIELD_ORDER
+from metrics import selector_hit
+
+
+_shared_registry = None
+_registry_lock = threading.Lock()
+
+
+class SelectorRegistry():
+
+    """This class keeps track of which selector of every field's fallback
+    chain (see field_selectors.py) found the value on recent pages. With
+    adaptive ordering the selectors which have not matched on any of the
+    last window pages of their field are moved to the end of the chain, 
+    hence pages do not pay for lookups which keep failing. The selectors
+    which do match keep their declared order, as some of them match the
+    same page with different values (e.g., header-price and priceToPay) and
+    the declared order decides which value is read. The statistics are kept
+    in a JSON file between runs and selectors which have not matched for 
+    stale_after pages are flagged.
+
+    Attributes:
+
+        path (str): The JSON file the statistics are kept in, by default
+        raw_data/selector_stats.json (see help(stats_path))
+        window (int): Pages without a match after which a selector is moved
+        to the end of its chain
+        stale_after (int): Pages without a match after which a selector is
+        flagged as stale
+        adaptive (bool): Whether the chains are reordered
+
+    """
+
+    def __init__(self, path: str = None, window: int = 200,
+                 stale_after: int = 500, adaptive: bool = True):
+
+        """
+        See help(SelectorRegistry) for details
+        """
+
+        self.path = path or stats_path()
+        self.window = window
+        self.stale_after = stale_after
+        self.adaptive = adaptive
+        self._lock = threading.Lock()
+        self.stats = {field: {'pages': 0,
+                              'selectors': {selector.xpath: _new_entry()
+                                            for selector in FIELD_SELECTORS[field]}}
+                      for field in FIELD_ORDER}
+        self._orders = {}
+        self._load()
+
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for field, stats in saved.get('fields', {}).items():
+            if field not in self.stats:
+                continue
+            self.stats[field]['pages'] = stats.get('pages', 0)
+            # Selectors which were removed from field_selectors.py are dropped
+            for xpath, entry in stats.get('selectors', {}).items():
+                if xpath in self.stats[field]['selectors']:
+                    self.stats[field]['selectors'][xpath].update(
+                        {key: entry[key] for key in _new_entry() if key in entry})
+
+
+    def chain(self, field: str):
+
+        """This method returns the selectors of a field in the order they
+        should be tried
+
+        Args:
+            field (str): The name of the field e.g., price
+
+        Returns:
+            list: The Selectors of the field
+        """
+
+        selectors = FIELD_SELECTORS[field]
+        if not self.adaptive:
+            return selectors
+        order = self._orders.get(field)
+        if order is None:
+            with self._lock:
+                entries = self.stats[field]['selectors']
+                pages = self.stats[field]['pages']
+                # Nothing is moved before the field has been seen on window
+                # pages, and sorted is stable, hence the selectors still
+                # matching keep their declared priority
+                order = sorted(selectors, key=lambda selector: self._dormant(
+                    entries[selector.xpath], pages))
+                self._orders[field] = order
+        return order
+
+
+    def _dormant(self, entry, pages):
+        if pages < self.window:
+            return False
+        return entry['last_hit'] is None or pages - entry['last_hit'] >= self.window
+
+
+    def chains(self):
+
+        """This method returns the chain of every field in the order they
+        should be tried, e.g., to send them to the browser
+
+        Returns:
+            dict: The Selectors of every field keyed by field name
+        """
+
+        return {field: self.chain(field) for field in FIELD_ORDER}
+
+
+    def record(self, field: str, selector):
+
+        """This method records which selector found the value of a field on
+        a page
+
+        Args:
+            field (str): The name of the field e.g., price
+            selector (Selector, None): The selector which matched or None if
+            the default value was used
+        """
+
+        index = None
+        if selector is not None:
+            index = FIELD_SELECTORS[field].index(selector)
+        selector_hit(field, index)
+
+        with self._lock:
+            stats = self.stats[field]
+            stats['pages'] += 1
+            if selector is not None:
+                entry = stats['selectors'][selector.xpath]
+                entry['hits'] += 1
+                entry['last_hit'] = stats['pages']
+            # The order is worked out again on the next lookup
+            self._orders.pop(field, None)
+
+
+    def stale(self):
+
+        """This method finds the selectors which have not matched on any of
+        the last stale_after pages of their field
+
+        Returns:
+            list: (field, xpath) pairs of the stale selectors
+        """
+
+        flagged = []
+        with self._lock:
+            for field, stats in self.stats.items():
+                for xpath, entry in stats['selectors'].items():
+                    last_hit = entry['last_hit'] or 0
+                    if stats['pages'] - last_hit >= self.stale_after:
+                        flagged.append((field, xpath))
+        return flagged
+
+
+    def save(self):
+
+        """This method writes the statistics to the JSON file and prints the
+        stale selectors"""
+
+        with self._lock:
+            saved = json.dumps({'fields': self.stats}, indent=2)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.part', 'w') as f:
+            f.write(saved)
+        os.replace(self.path + '.part', self.path)
+
+        for field, xpath in self.stale():
+            print(f'Selector of {field} has not matched in the last '
+                  f'{self.stale_after} pages: {xpath}')
+
+
+def _new_entry():
+    return {'hits': 0, 'last_hit': None}
+
+
+def stats_path():
+
+    """This function returns where the selector statistics are kept: the
+    raw_data directory, whether or not the process has changed into it yet,
+    hence every run reads the file the previous run saved
+
+    Returns:
+        str: The absolute path of selector_stats.json
+    """
+
+    raw_dir = os.getcwd()
+    if os.path.basename(raw_dir) != 'raw_data':
+        raw_dir = os.path.join(raw_dir, 'raw_data')
+    return os.path.join(raw_dir, 'selector_stats.json')
+
+
+def shared_registry():
+
+    """This function returns the registry shared by every scraper of the
+    process, created from the selector_* environment variables
+
+    Returns:
+        SelectorRegistry: The shared registry
+    """
+
+    global _shared_registry
+    with _registry_lock:
+        if _shared_registry is None:
+            _shared_registry = SelectorRegistry(
+                window=int(os.getenv('selector_window', 200)),
+                stale_after=int(os.getenv('selector_stale_pages', 500)),
+                adaptive=str(os.getenv('adaptive_selectors', 'yes')).lower() == 'yes')
+        return _shared_registry
@@ -0,0 +1,137 @@
+# Import all necessary packages
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JsonLinesSink():
+
+    """This sink appends every product to a JSON lines file as soon as it is
+    scraped, one JSON object per line, hence nothing is lost if the run
+    stops halfway.
+
+    Attributes:
+
+        path (str): The path of the JSON lines file
+
+    """
+
+    def __init__(self, path: str):
+
+        """
+        See help(JsonLinesSink) for details
+        """
+
+        self.path = path
+        self.file = open(path, 'w')
+
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+
+    def close(self):
+        self.file.close()
+
+
+class ImageSink():
+
+    """This sink starts downloading the image of every product as soon as it
+    is scraped. At most max_pending downloads are queued at any time, after
+    which write blocks until one of them has finished.
+
+    Attributes:
+
+        downloader (ImageDownloader): Downloads and names the images
+        max_pending (int): Maximum number of queued or running downloads
+        track (bool): Whether the downloads are kept until results collects
+        them, e.g., to upload the images of a batch
+
+    """
+
+    def __init__(self, downloader, max_pending: int = 32, track: bool = False):
+
+        """
+        See help(ImageSink) for details
+        """
+
+        self.downloader = downloader
+        self.pool = ThreadPoolExecutor(max_workers=downloader.workers)
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.track = track
+        self.futures = {}
+
+
+    def write(self, record: dict):
+        self.pending.acquire()
+        future = self.pool.submit(self.downloader.download,
+                                  record['Unique Product ID'],
+                                  record['Image link'])
+        future.add_done_callback(lambda _: self.pending.release())
+        if self.track:
+            self.futures[record['Unique Product ID']] = future
+
+
+    def results(self, records):
+
+        """This method waits until the images of the given products have
+        been downloaded
+
+        Args:
+            records (list): The products, which must have been written to the
+            sink with track on
+
+        Returns:
+            list: The path of every image, None where the download failed
+        """
+
+        futures = [self.futures.pop(record['Unique Product ID'], None)
+                   for record in records]
+        return [future.result() for future in futures if future is not None]
+
+
+    def close(self):
+        # Waits until every queued image has been downloaded
+        self.pool.shutdown(wait=True)
+
+
+class BatchSink():
+
+    """This sink collects products in a buffer of at most batch_size products
+    and passes every full buffer to a callback, e.g., an upload to RDS. The
+    remaining products are passed on when the sink is closed.
+
+    Attributes:
+
+        flush_batch (callable): Called with the list of buffered products
+        batch_size (int): Number of products per batch
+
+    """
+
+    def __init__(self, flush_batch, batch_size: int = 25):
+
+        """
+        See help(BatchSink) for details
+        """
+
+        self.flush_batch = flush_batch
+        self.batch_size = batch_size
+        self.buffer = []
+
+
+    def write(self, record: dict):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self):
+        if self.buffer:
+            self.flush_batch(self.buffer)
+            self.buffer = []
+
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,293 @@
+# Import all necessary packages
+
+import json
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+
+class WorkQueue():
+
+    """This class is a queue of product links in a PostgreSQL table shared
+    by a coordinator and any number of worker containers. Workers lease
+    links with SELECT ... FOR UPDATE SKIP LOCKED, hence no two workers get
+    the same link and nobody waits on a locked row. A lease expires after
+    visibility_timeout seconds, so the links of a worker which died are
+    handed out again, up to max_attempts times.
+
+    Attributes:
+
+        engine (Engine): SQLAlchemy engine connected to PostgreSQL
+        table (str): The name of the queue table
+        visibility_timeout (float): Seconds a leased link stays invisible to
+        other workers
+        max_attempts (int): Leases after which a link is given up
+
+    """
+
+    def __init__(self, engine, table: str = 'scrape_queue',
+                 visibility_timeout: float = 300, max_attempts: int = 3):
+
+        """
+        See help(WorkQueue) for details
+        """
+
+        self.engine = engine
+        self.table = table
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+
+    def ensure_table(self):
+
+        """This method creates the queue table if it is missing"""
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id BIGSERIAL PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    leased_by TEXT,
+                    lease_expires TIMESTAMPTZ,
+                    result JSONB,
+                    error TEXT,
+                    UNIQUE (run_id, link))'''))
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_status_idx '
+                f'ON {self.table} (status, id)'))
+
+
+    def enqueue(self, run_id: str, links):
+
+        """This method adds the links of a run to the queue
+
+        Args:
+            run_id (str): Identifies the links of one coordinator run
+            links (list): The product links to scrape
+
+        Returns:
+            int: The number of links added
+        """
+
+        links = list(dict.fromkeys(links))
+        if not links:
+            return 0
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                text(f'INSERT INTO {self.table} (run_id, link) '
+                     f'SELECT :run_id, unnest(CAST(:links AS TEXT[])) '
+                     f'ON CONFLICT (run_id, link) DO NOTHING'),
+                {'run_id': run_id, 'links': links})
+        return result.rowcount
+
+
+    def lease(self, worker_id: str, batch: int = 1):
+
+        """This method leases pending links, or links whose lease expired,
+        to a worker
+
+        Args:
+            worker_id (str): Identifies the worker
+            batch (int): Maximum number of links to lease
+
+        Returns:
+            list: (id, link) pairs of the leased links, empty if there is no
+            work
+        """
+
+        with self.engine.begin() as conn:
+            rows = conn.execute(text(f'''
+                UPDATE {self.table}
+                SET status = 'leased', leased_by = :worker, attempts = attempts + 1,
+                    lease_expires = now() + make_interval(secs => :timeout)
+                WHERE id IN (
+                    SELECT id FROM {self.table}
+                    WHERE (status = 'pending'
+                           OR (status = 'leased' AND lease_expires < now()))
+                      AND attempts < :max_attempts
+                    ORDER BY id
+                    LIMIT :batch
+                    FOR UPDATE SKIP LOCKED)
+                RETURNING id, link'''),
+                {'worker': worker_id, 'timeout': self.visibility_timeout,
+                 'max_attempts': self.max_attempts, 'batch': batch}).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+
+    def extend(self, item_id: int, worker_id: str):
+
+        """This method renews the lease of a link which takes long to scrape
+
+        Args:
+            item_id (int): The id returned by lease
+            worker_id (str): The worker holding the lease
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+
+        with self.engine.begin() as conn:
+            result = conn.execute(text(f'''
+                UPDATE {self.table}
+                SET lease_expires = now() + make_interval(secs => :timeout)
+                WHERE id = :id AND leased_by = :worker AND status = 'leased' '''),
+                {'id': item_id, 'worker': worker_id,
+                 'timeout': self.visibility_timeout})
+        return result.rowcount == 1
+
+
+    @contextmanager
+    def renewing(self, item_id: int, worker_id: str):
+
+        """This context manager renews the lease of a link every third of
+        visibility_timeout while the with block runs, hence a page which
+        takes long to scrape is not handed out to another worker
+
+        Args:
+            item_id (int): The id returned by lease
+            worker_id (str): The worker holding the lease
+        """
+
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.visibility_timeout / 3):
+                try:
+                    if not self.extend(item_id, worker_id):
+                        return
+                except Exception as error:
+                    print(f'Could not renew the lease of {item_id}: {error!r}')
+                    return
+
+        renewer = threading.Thread(target=renew, daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+
+
+    def complete(self, item_id: int, worker_id: str, result: dict):
+
+        """This method stores the product scraped from a leased link
+
+        Args:
+            item_id (int): The id returned by lease
+            worker_id (str): The worker holding the lease
+            result (dict): The product information
+
+        Returns:
+            bool: False if the lease had expired and was taken over, in which
+            case the result is dropped
+        """
+
+        with self.engine.begin() as conn:
+            updated = conn.execute(text(f'''
+                UPDATE {self.table}
+                SET status = 'done', result = CAST(:result AS JSONB),
+                    lease_expires = NULL
+                WHERE id = :id AND leased_by = :worker AND status = 'leased' '''),
+                {'id': item_id, 'worker': worker_id,
+                 'result': json.dumps(result)})
+        return updated.rowcount == 1
+
+
+    def fail(self, item_id: int, worker_id: str, error: str):
+
+        """This method hands a link back after scraping it failed, or gives
+        it up after max_attempts
+
+        Args:
+            item_id (int): The id returned by lease
+            worker_id (str): The worker holding the lease
+            error (str): What went wrong
+        """
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f'''
+                UPDATE {self.table}
+                SET status = CASE WHEN attempts < :max_attempts
+                                  THEN 'pending' ELSE 'failed' END,
+                    error = :error, lease_expires = NULL
+                WHERE id = :id AND leased_by = :worker AND status = 'leased' '''),
+                {'id': item_id, 'worker': worker_id, 'error': error,
+                 'max_attempts': self.max_attempts})
+
+
+    def progress(self, run_id: str):
+
+        """This method counts the links of a run by status. Links whose last
+        lease expired after max_attempts are marked as failed first.
+
+        Args:
+            run_id (str): The coordinator run
+
+        Returns:
+            dict: The number of links keyed by status
+        """
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f'''
+                UPDATE {self.table} SET status = 'failed', error = 'lease expired'
+                WHERE run_id = :run_id AND status = 'leased'
+                  AND lease_expires < now() AND attempts >= :max_attempts'''),
+                {'run_id': run_id, 'max_attempts': self.max_attempts})
+            rows = conn.execute(text(
+                f'SELECT status, count(*) FROM {self.table} '
+                f'WHERE run_id = :run_id GROUP BY status'),
+                {'run_id': run_id}).fetchall()
+        return {status: count for status, count in rows}
+
+
+    def results(self, run_id: str):
+
+        """This method returns the products scraped for a run
+
+        Args:
+            run_id (str): The coordinator run
+
+        Returns:
+            list: The product information of every finished link, in the
+            order the links were queued
+        """
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                f'SELECT result FROM {self.table} '
+                f"WHERE run_id = :run_id AND status = 'done' ORDER BY id"),
+                {'run_id': run_id}).fetchall()
+        return [row[0] for row in rows]
+
+
+def new_run_id(table: str):
+
+    """This function creates the id of a coordinator run
+
+    Args:
+        table (str): The RDS table the products go to e.g., best_seller
+
+    Returns:
+        str: e.g., best_seller-3f2a...
+    """
+
+    return f'{table}-{uuid.uuid4().hex[:12]}'
+
+
+def worker_name():
+
+    """This function names a worker after its host (the container id in
+    Docker) and process
+
+    Returns:
+        str: e.g., 4c1d2e3f-17
+    """
+
+    return f'{socket.gethostname()}-{os.getpid()}'
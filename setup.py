@@ -9,5 +9,6 @@ setup(
     author='Areeb Shafqat',
     license='MIT',
     packages=find_packages(),
-    install_requires=['sqlalchemy', 'psycopg2-binary', 'selenium', 'pandas', 'webdriver-manager', 'requests', 'tqdm', 'pydantic', 'boto3', 'uuid', 'typing'],
+    install_requires=['sqlalchemy', 'psycopg2-binary', 'selenium', 'pandas', 'webdriver-manager', 'requests', 'lxml', 'tqdm', 'pydantic', 'boto3', 'uuid', 'typing'],
+    extras_require={'parquet': ['pyarrow']},
 ) 
@@ -4,6 +4,7 @@ import time
 from PIL import Image
 from selenium.webdriver.common.by import By
 from Project.main import Run_Scraper
+from Project.image_downloader import ImageDownloader
 
 class ScraperTest(unittest.TestCase):
     """
@@ -42,7 +43,9 @@ class ScraperTest(unittest.TestCase):
         self.assertEqual(dataframe.isna().sum().sum(), 0)
         # check image exists and verify format
         self.scrap_1.dump_json_image_upload(prod_diction)
-        with Image.open('0.jpg') as image:
+        image_name = ImageDownloader.file_name(prod_diction['Unique Product ID'][0],
+                                               prod_diction['Image link'][0])
+        with Image.open(image_name) as image:
             self.assertEqual(type(image).format, 'JPEG') 
 
     @classmethod
@@ -0,0 +1,73 @@
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine, text
+from Project.product_ids import backfill
+
+
+class BackfillTest(unittest.TestCase):
+    """
+    This test class ensures backfill rewrites the product IDs stored in a table
+    and removes the duplicates created by the old IDs, using an in-memory SQLite database
+    """
+    def setUp(self):
+
+        """Set up method creates a best_seller table holding one product stored twice
+        under two old IDs, a product with a correct ID and a link without an ASIN
+        """
+        self.engine = create_engine('sqlite://')
+        rows = pd.DataFrame({
+            'UUID': ['b-uuid', 'a-uuid', 'c-uuid', 'd-uuid'],
+            'Unique Product ID': ['N5WRWNW/r', 'B08N5WRW', 'B07ZPKBL9V', 'gp/bestse'],
+            'Title': ['Echo Dot', 'Echo Dot', 'Kindle', 'Gift card'],
+            'Page Link': ['https://www.amazon.co.uk/Echo-Dot/dp/B08N5WRWNW/ref=zg_bs_1',
+                          'https://www.amazon.co.uk/dp/B08N5WRWNW?psc=1',
+                          'https://www.amazon.co.uk/dp/B07ZPKBL9V',
+                          'https://www.amazon.co.uk/gp/bestsellers/gift-cards']})
+        with self.engine.begin() as conn:
+            rows.to_sql('best_seller', conn, index=False)
+
+    def _table(self):
+        with self.engine.connect() as conn:
+            return pd.read_sql(text('SELECT * FROM best_seller ORDER BY "UUID"'), conn)
+
+    def test_dry_run(self):
+        """
+        This test would run successfully if a dry run counts the changes without writing them
+        """
+        counts = backfill(self.engine, 'best_seller', dry_run=True)
+        self.assertEqual(counts, {'rows': 4, 'updated': 2, 'removed': 1})
+        self.assertEqual(len(self._table()), 4)
+
+    def test_backfill(self):
+        """
+        This test would run successfully if every product keeps a single row with its ASIN
+        as ID and short link, the other columns are untouched and a second run changes nothing
+        """
+        backfill(self.engine, 'best_seller')
+        table = self._table()
+        self.assertEqual(list(table['UUID']), ['a-uuid', 'c-uuid', 'd-uuid'])
+        self.assertEqual(list(table['Unique Product ID'][:2]), ['B08N5WRWNW', 'B07ZPKBL9V'])
+        self.assertTrue(table['Unique Product ID'][2].startswith('URL-'))
+        self.assertEqual(table['Page Link'][0], 'https://www.amazon.co.uk/dp/B08N5WRWNW')
+        self.assertEqual(list(table['Title']), ['Echo Dot', 'Kindle', 'Gift card'])
+        self.assertEqual(backfill(self.engine, 'best_seller'),
+                         {'rows': 3, 'updated': 0, 'removed': 0})
+
+    def test_history_keeps_duplicates(self):
+        """
+        This test would run successfully if no row of a history table is removed
+        """
+        counts = backfill(self.engine, 'best_seller', collapse=False)
+        self.assertEqual(counts['removed'], 0)
+        self.assertEqual(set(self._table()['Unique Product ID'][:2]), {'B08N5WRWNW'})
+
+    def test_missing_table(self):
+        """
+        This test would run successfully if a table which does not exist is left alone
+        """
+        self.assertEqual(backfill(self.engine, 'most_wished_for'),
+                         {'rows': 0, 'updated': 0, 'removed': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()